@@ -73,7 +73,7 @@ def all_taken_slots(appointments: dict, services: dict) -> set[str]:
         svc_ids = bk.get("services", [])
         _, n = calc_duration(svc_ids, services)
         n = max(n, bk.get("duration_slots", 1))
-        dt = datetime.strptime(slot_key, "%Y-%m-%d %H:%M")
+        dt = datetime.fromisoformat(slot_key)
         for i in range(n):
             t = dt + timedelta(minutes=30 * i)
             taken.add(t.strftime("%Y-%m-%d %H:%M"))
@@ -100,7 +100,7 @@ def available_slots_for_date(
         _, n = calc_duration(svc_ids, services)
         n = max(n, bk.get("duration_slots", 1))
         try:
-            dt = datetime.strptime(slot_key, "%Y-%m-%d %H:%M")
+            dt = datetime.fromisoformat(slot_key)
         except ValueError:
             continue
         for i in range(n):
@@ -273,7 +273,7 @@ def create_booking(body: BookingRequest):
     dt = datetime.strptime(body.date, "%Y-%m-%d")
     date_str = f"{day_names[dt.weekday()]} {dt.day} {month_names[dt.month-1]}"
 
-    start_dt = datetime.strptime(slot_key, "%Y-%m-%d %H:%M")
+    start_dt = datetime.fromisoformat(slot_key)
     end_dt   = start_dt + timedelta(minutes=total_mins)
     time_range = f"{body.time}–{end_dt.strftime('%H:%M')}"
 
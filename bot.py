@@ -22,21 +22,37 @@ Customer commands:
 from __future__ import annotations
 
 import asyncio
+import atexit
+import hashlib
+import heapq
+import itertools
 import json
 import logging
 import logging.handlers
-import math
+import operator
 import os
+import queue
 import re
 import sqlite3
+import sys
+import threading
+import time
 from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta
+from functools import lru_cache, wraps
 from pathlib import Path
-from typing import Any
+from typing import AbstractSet, Any, Awaitable, Callable, Iterable, Iterator
 from zoneinfo import ZoneInfo
 
+import orjson
 from dotenv import load_dotenv
+from sortedcontainers import SortedList
 from telegram import (
+    BotCommand,
+    BotCommandScopeChat,
+    BotCommandScopeDefault,
     Contact,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
@@ -46,12 +62,14 @@ from telegram import (
     Update,
     WebAppInfo,
 )
+from telegram.error import RetryAfter
 from telegram.ext import (
     Application,
     CallbackQueryHandler,
     CommandHandler,
     ContextTypes,
     ConversationHandler,
+    Job,
     MessageHandler,
     filters,
 )
@@ -60,17 +78,28 @@ from telegram.ext import (
 _LOG_FORMAT = "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s"
 _LOG_FILE   = Path(__file__).parent / "bot.log"
 
-_root = logging.getLogger()
-_root.setLevel(logging.INFO)
-_root.addHandler(logging.StreamHandler())
-_root.addHandler(
+# Handlers do their (blocking) I/O on the QueueListener thread; the event loop
+# only enqueues records.
+_log_handlers: list[logging.Handler] = [
+    logging.StreamHandler(),
     logging.handlers.RotatingFileHandler(
         _LOG_FILE, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8"
-    )
-)
-for _h in _root.handlers:
+    ),
+]
+for _h in _log_handlers:
     _h.setFormatter(logging.Formatter(_LOG_FORMAT))
 
+_log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(
+    _log_queue, *_log_handlers, respect_handler_level=True
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+_root = logging.getLogger()
+_root.setLevel(logging.INFO)
+_root.addHandler(logging.handlers.QueueHandler(_log_queue))
+
 logger = logging.getLogger(__name__)
 
 # ─────────────────────────── Config ──────────────────────────────────────────
@@ -83,12 +112,33 @@ BARBER_CHAT_IDS: set[int] = {int(x.strip()) for x in _barber_raw.split(",") if x
 BARBER_CHAT_ID:  int  = int(_barber_raw.split(",")[0].strip())  # primary barber
 MINIAPP_URL:     str  = os.getenv("MINIAPP_URL", "")
 MINIAPP_ENABLED: bool = os.getenv("MINIAPP_ENABLED", "false").lower() == "true"
+# Webhook mode (optional) — when WEBHOOK_URL is set the bot listens on PORT
+# instead of long-polling getUpdates.  `python bot.py --polling` forces polling.
+WEBHOOK_URL:     str  = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PORT:    int  = int(os.getenv("PORT", "8443"))
+WEBHOOK_SECRET:  str | None = os.getenv("SECRET_TOKEN") or None
 
 
 def _is_barber(uid: int) -> bool:
     return uid in BARBER_CHAT_IDS
 
 
+def _barber_only(alert: str | None = None):
+    """Callback decorator: non-barbers get *alert* and nothing else.  Without an
+    alert the tap is ignored outright — no answerCallbackQuery round-trip; the
+    client drops the spinner on its own timeout."""
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            if not _is_barber(update.effective_user.id):
+                if alert is not None:
+                    await update.callback_query.answer(alert, show_alert=True)
+                return None
+            return await fn(update, context)
+        return wrapper
+    return decorator
+
+
 async def _send_to_all_barbers(bot, **kwargs):
     """Send a message to all barbers. Returns dict {chat_id: message} for all sent."""
     results = {}
@@ -109,6 +159,7 @@ async def _edit_all_barber_msgs(bot, barber_msg_ids: dict, **kwargs):
         except Exception as exc:
             logger.error("Edit barber msg %d/%d failed: %s", int(bid_str), msg_id, exc)
 
+
 TZ         = ZoneInfo("Asia/Tashkent")   # UTC+5
 DAYS_AHEAD = 14
 
@@ -116,6 +167,10 @@ DAYS_AHEAD = 14
 _CONFIG_FILE = Path(__file__).parent / "schedule_config.json"
 _DB_FILE     = Path(__file__).parent / "barber.db"
 
+# Short day labels for the config UI (Russian, barber-facing)
+_DAY_SHORT = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+
 _CONFIG_DEFAULTS: dict[str, Any] = {
     "start_hour": 9,
     "end_hour":   18,
@@ -138,23 +193,99 @@ def _load_config() -> dict[str, Any]:
 
 
 def _save_config() -> None:
+    """Persist schedule_config and refresh the hot-path copies.  No-op if unchanged.
+
+    The file itself is written by the db-writer thread: a burst of /config
+    taps only replaces _config_blob, and the next writer tick saves the latest.
+    """
+    global _saved_config, _config_blob
     data = {
         "start_hour": schedule_config["start_hour"],
         "end_hour":   schedule_config["end_hour"],
         "work_days":  sorted(schedule_config["work_days"]),   # set → sorted list
     }
-    _CONFIG_FILE.write_text(json.dumps(data, indent=2))
-    logger.info("Schedule config saved: %s", data)
+    if data == _saved_config:
+        return
+    _refresh_config_cache()
+    _saved_config = data
+    _config_blob  = json.dumps(data, indent=2)
+    _write_q.put_nowait([])                 # wake the writer
+
+
+_config_blob:    str | None = None      # latest config JSON, assigned only by _save_config
+_written_config: str | None = None      # last blob the writer saved
+
+
+def _write_config_file() -> None:
+    """Writer-thread side of _save_config."""
+    global _written_config
+    blob = _config_blob
+    if blob is None or blob is _written_config:
+        return
+    try:
+        _CONFIG_FILE.write_text(blob)
+    except OSError as exc:
+        logger.error("Could not save schedule config: %s", exc)
+        return
+    _written_config = blob
+    logger.info("Schedule config saved: %s", " ".join(blob.split()))
+
+
+# Hot-path copies of schedule_config — slot builders read these instead of
+# doing dict lookups per slot.  Only _refresh_config_cache() assigns them.
+START_HOUR: int
+END_HOUR:   int
+WORK_DAYS:  frozenset[int]
+_work_days_label: str                  # "Пн Вт Ср …" for the /config summary
+_config_version = 0
+
+
+def _refresh_config_cache() -> None:
+    global START_HOUR, END_HOUR, WORK_DAYS, _work_days_label, _config_version
+    START_HOUR = schedule_config["start_hour"]
+    END_HOUR   = schedule_config["end_hour"]
+    WORK_DAYS  = frozenset(schedule_config["work_days"])
+    _work_days_label = " ".join(_DAY_SHORT[d] for d in sorted(WORK_DAYS)) or "—"
+    _config_version += 1
 
 
 schedule_config: dict[str, Any] = _load_config()
+_saved_config:   dict[str, Any] = {
+    "start_hour": schedule_config["start_hour"],
+    "end_hour":   schedule_config["end_hour"],
+    "work_days":  sorted(schedule_config["work_days"]),
+}
+_refresh_config_cache()
 
 
 # ─────────────────────────── SQLite persistence ──────────────────────────────
+# One connection for the whole process, opened in autocommit mode by _init_db.
+# Handlers never write directly: _db_* helpers enqueue (sql, params) groups and
+# the _db_writer thread commits whatever has queued up every ~50 ms.  Reads
+# and the writer share the connection under _DB_LOCK.
+
+_CONN:    sqlite3.Connection
+_DB_LOCK = threading.RLock()
+
+_WRITE_INTERVAL = 0.05                      # seconds between writer commits
+# Items: a group of (sql, params), a threading.Event set once everything
+# queued before it is committed (_db_flush), or None to stop the writer.
+_write_q: queue.SimpleQueue[list[tuple[str, tuple]] | threading.Event | None] = queue.SimpleQueue()
+_writer:  threading.Thread | None = None
+_batch_local = threading.local()            # .group while inside _db_batch()
+
 
 def _init_db() -> None:
-    with sqlite3.connect(_DB_FILE) as conn:
-        conn.executescript("""
+    global _CONN
+    _CONN = sqlite3.connect(_DB_FILE, check_same_thread=False, isolation_level=None)
+    with _DB_LOCK:
+        # WAL lets the API backend read while the bot writes; NORMAL sync is
+        # durable enough for WAL and skips an fsync per commit.
+        _CONN.execute("PRAGMA journal_mode=WAL")
+        _CONN.execute("PRAGMA synchronous=NORMAL")
+        _CONN.execute("PRAGMA temp_store=MEMORY")
+        _CONN.execute("PRAGMA mmap_size=268435456")
+        _CONN.executescript("""
             CREATE TABLE IF NOT EXISTS bookings (
                 slot_key TEXT PRIMARY KEY,
                 data     TEXT NOT NULL
@@ -172,6 +303,10 @@ def _init_db() -> None:
             CREATE TABLE IF NOT EXISTS blocked_slots (
                 slot_key TEXT PRIMARY KEY
             );
+            CREATE TABLE IF NOT EXISTS meta (
+                key   TEXT PRIMARY KEY,
+                value TEXT
+            );
             CREATE TABLE IF NOT EXISTS booking_log (
                 id        INTEGER PRIMARY KEY AUTOINCREMENT,
                 ts        TEXT    NOT NULL,
@@ -181,115 +316,201 @@ def _init_db() -> None:
                 data      TEXT
             );
         """)
+    _start_db_writer()
     logger.info("DB initialised: %s", _DB_FILE)
 
 
 def _load_all() -> None:
     global _pending_counter
-    with sqlite3.connect(_DB_FILE) as conn:
-        for slot_key, data in conn.execute("SELECT slot_key, data FROM bookings"):
-            appointments[slot_key] = json.loads(data)
-        max_bid = 0
-        for bid, data in conn.execute("SELECT bid, data FROM pending"):
-            pending_bookings[bid] = json.loads(data)
-            max_bid = max(max_bid, bid)
-        _pending_counter = max_bid
+    with _DB_LOCK:
+        conn = _CONN
+        conn.execute("PRAGMA cache_size=-20000")
+        loads = orjson.loads
+        rows  = conn.execute("SELECT slot_key, data FROM bookings").fetchall()
+        appointments.update({k: loads(v) for k, v in rows})
+        rows  = conn.execute("SELECT bid, data FROM pending").fetchall()
+        pending_bookings.update({b: loads(v) for b, v in rows})
+        _pending_counter = max(pending_bookings, default=0)
         for user_id, name, phone, lang in conn.execute(
             "SELECT user_id, name, phone, lang FROM customers"
-        ):
+        ).fetchall():
             entry: dict[str, str] = {"lang": lang or "ru"}
             if name:  entry["name"]  = name
             if phone: entry["phone"] = phone
             customer_cache[user_id] = entry
-        for (slot_key,) in conn.execute("SELECT slot_key FROM blocked_slots"):
-            blocked_slots.add(slot_key)
+        blocked_slots.update(
+            k for (k,) in conn.execute("SELECT slot_key FROM blocked_slots").fetchall()
+        )
+    _rebuild_indexes()
     logger.info(
         "DB loaded: %d bookings, %d pending, %d customers",
         len(appointments), len(pending_bookings), len(customer_cache),
     )
 
 
-def _db_save_booking(slot_key: str, bk: dict) -> None:
+def _dumps(obj: Any) -> str:
+    """orjson → str, so rows stay TEXT for the API backend's json.loads."""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _db_execute(sql: str, params: tuple = ()) -> None:
+    group = getattr(_batch_local, "group", None)
+    if group is not None:
+        group.append((sql, params))
+    else:
+        _write_q.put_nowait([(sql, params)])
+
+
+@contextmanager
+def _db_batch() -> Iterator[None]:
+    """Queue several _db_* calls as one group, committed in the same transaction."""
+    if getattr(_batch_local, "group", None) is not None:   # nested: join the outer group
+        yield
+        return
+    _batch_local.group = group = []
     try:
-        with sqlite3.connect(_DB_FILE) as conn:
-            conn.execute(
-                "INSERT OR REPLACE INTO bookings (slot_key, data) VALUES (?, ?)",
-                (slot_key, json.dumps(bk)),
-            )
-    except Exception as exc:
-        logger.error("DB save_booking failed for %s: %s", slot_key, exc)
+        yield
+    finally:
+        _batch_local.group = None
+    if group:
+        _write_q.put_nowait(group)
+
+
+def _db_writer_loop() -> None:
+    while True:
+        items = [_write_q.get()]
+        time.sleep(_WRITE_INTERVAL)             # let a burst of writes pile up
+        while True:
+            try:
+                items.append(_write_q.get_nowait())
+            except queue.Empty:
+                break
+        stop       = None in items
+        flushes    = [i for i in items if isinstance(i, threading.Event)]
+        statements = [st for i in items if isinstance(i, list) for st in i]
+        try:
+            with _DB_LOCK:
+                _CONN.execute("BEGIN IMMEDIATE")
+                # Consecutive statements with the same SQL (e.g. a broadcast's
+                # log rows) go through one executemany; order is preserved.
+                for sql, run in itertools.groupby(statements, key=operator.itemgetter(0)):
+                    _execute_run(sql, [params for _, params in run])
+                _CONN.execute("COMMIT")
+        except sqlite3.Error as exc:
+            logger.error("DB commit failed, %d statements lost: %s", len(statements), exc)
+            with _DB_LOCK:
+                if _CONN.in_transaction:
+                    _CONN.execute("ROLLBACK")
+        finally:
+            _write_config_file()
+            for done in flushes:
+                done.set()
+        if stop:
+            return
 
 
-def _db_delete_booking(slot_key: str) -> None:
+def _execute_run(sql: str, rows: list[tuple]) -> None:
+    """executemany, falling back to one-by-one so a bad row only loses itself."""
+    if len(rows) == 1:
+        try:
+            _CONN.execute(sql, rows[0])
+        except sqlite3.Error as exc:
+            logger.error("DB write failed (%s %r): %s", sql, rows[0], exc)
+        return
+    _CONN.execute("SAVEPOINT run")
     try:
-        with sqlite3.connect(_DB_FILE) as conn:
-            conn.execute("DELETE FROM bookings WHERE slot_key = ?", (slot_key,))
-    except Exception as exc:
-        logger.error("DB delete_booking failed for %s: %s", slot_key, exc)
+        _CONN.executemany(sql, rows)
+    except sqlite3.Error:
+        _CONN.execute("ROLLBACK TO run")
+        for params in rows:
+            try:
+                _CONN.execute(sql, params)
+            except sqlite3.Error as exc:
+                logger.error("DB write failed (%s %r): %s", sql, params, exc)
+    _CONN.execute("RELEASE run")
+
+
+def _start_db_writer() -> None:
+    global _writer
+    if _writer is None:
+        _writer = threading.Thread(target=_db_writer_loop, name="db-writer", daemon=True)
+        _writer.start()
+        atexit.register(_stop_db_writer)
+
+
+def _db_flush() -> None:
+    """Block until every queued write has been committed."""
+    done = threading.Event()
+    _write_q.put(done)
+    done.wait()
+
+
+def _stop_db_writer() -> None:
+    global _writer
+    if _writer is not None:
+        _write_q.put(None)
+        _writer.join()
+        _writer = None
+
+
+def _db_save_booking(slot_key: str, bk: dict) -> None:
+    _db_execute(
+        "INSERT OR REPLACE INTO bookings (slot_key, data) VALUES (?, ?)",
+        (slot_key, _dumps(bk)),
+    )
+
+
+def _db_delete_booking(slot_key: str) -> None:
+    _db_execute("DELETE FROM bookings WHERE slot_key = ?", (slot_key,))
 
 
 def _db_save_pending(bid: int, bk: dict) -> None:
-    try:
-        with sqlite3.connect(_DB_FILE) as conn:
-            conn.execute(
-                "INSERT OR REPLACE INTO pending (bid, data) VALUES (?, ?)",
-                (bid, json.dumps(bk)),
-            )
-    except Exception as exc:
-        logger.error("DB save_pending failed for bid=%d: %s", bid, exc)
+    _db_execute(
+        "INSERT OR REPLACE INTO pending (bid, data) VALUES (?, ?)",
+        (bid, _dumps(bk)),
+    )
 
 
 def _db_delete_pending(bid: int) -> None:
-    try:
-        with sqlite3.connect(_DB_FILE) as conn:
-            conn.execute("DELETE FROM pending WHERE bid = ?", (bid,))
-    except Exception as exc:
-        logger.error("DB delete_pending failed for bid=%d: %s", bid, exc)
+    _db_execute("DELETE FROM pending WHERE bid = ?", (bid,))
 
 
 def _db_save_customer(uid: int) -> None:
     c = customer_cache.get(uid, {})
-    with sqlite3.connect(_DB_FILE) as conn:
-        conn.execute(
-            "INSERT OR REPLACE INTO customers (user_id, name, phone, lang) VALUES (?, ?, ?, ?)",
-            (uid, c.get("name"), c.get("phone"), c.get("lang", "ru")),
-        )
+    _db_execute(
+        "INSERT OR REPLACE INTO customers (user_id, name, phone, lang) VALUES (?, ?, ?, ?)",
+        (uid, c.get("name"), c.get("phone"), c.get("lang", "ru")),
+    )
 
 
 def _db_save_blocked(slot_key: str) -> None:
-    try:
-        with sqlite3.connect(_DB_FILE) as conn:
-            conn.execute("INSERT OR IGNORE INTO blocked_slots (slot_key) VALUES (?)", (slot_key,))
-    except Exception as exc:
-        logger.error("DB save_blocked failed for %s: %s", slot_key, exc)
+    _db_execute("INSERT OR IGNORE INTO blocked_slots (slot_key) VALUES (?)", (slot_key,))
 
 
 def _db_delete_blocked(slot_key: str) -> None:
-    try:
-        with sqlite3.connect(_DB_FILE) as conn:
-            conn.execute("DELETE FROM blocked_slots WHERE slot_key = ?", (slot_key,))
-    except Exception as exc:
-        logger.error("DB delete_blocked failed for %s: %s", slot_key, exc)
+    _db_execute("DELETE FROM blocked_slots WHERE slot_key = ?", (slot_key,))
+
+
+def _db_get_meta(key: str) -> str | None:
+    with _DB_LOCK:
+        row = _CONN.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _db_set_meta(key: str, value: str) -> None:
+    _db_execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
 
 
 def _db_log_event(event: str, slot_key: str | None, user_id: int | None,
                   data: dict | None = None) -> None:
     """Append a row to booking_log. Events: created, approved, rejected,
     cancelled_barber, cancelled_user, timeout, rescheduled."""
-    try:
-        with sqlite3.connect(_DB_FILE) as conn:
-            conn.execute(
-                "INSERT INTO booking_log (ts, event, slot_key, user_id, data) "
-                "VALUES (?, ?, ?, ?, ?)",
-                (datetime.now(tz=TZ).isoformat(), event, slot_key,
-                 user_id, json.dumps(data) if data else None),
-            )
-    except Exception as exc:
-        logger.error("DB log_event failed (%s %s): %s", event, slot_key, exc)
-
-
-# Short day labels for the config UI (Russian, barber-facing)
-_DAY_SHORT = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+    _db_execute(
+        "INSERT INTO booking_log (ts, event, slot_key, user_id, data) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (datetime.now(tz=TZ).isoformat(), event, slot_key,
+         user_id, _dumps(data) if data else None),
+    )
 
 
 # ─────────────────────────── Date/time formatting ────────────────────────────
@@ -303,20 +524,36 @@ _DAYS_SHORT: dict[str, list[str]] = {
     "uz": ["Du", "Se", "Ch", "Pa", "Ju", "Sh", "Ya"],
 }
 
+# "00:00", "00:30", … "23:30" — index = minute_of_day // 30
+_SLOT_STRINGS: tuple[str, ...] = tuple(
+    f"{sm // 60:02d}:{sm % 60:02d}" for sm in range(0, 24 * 60, 30)
+)
+# "HH:MM" → (hour, minute), parsed once for every grid slot
+_SLOT_META: dict[str, tuple[int, int]] = {
+    t: (int(t[:2]), int(t[3:5])) for t in _SLOT_STRINGS
+}
+
+
+def _hm(t: str) -> tuple[int, int]:
+    """(hour, minute) of an "HH:MM" string; off-grid times are parsed."""
+    meta = _SLOT_META.get(t)
+    return meta if meta is not None else (int(t[:2]), int(t[3:5]))
 
+
+@lru_cache(maxsize=256)
 def _fmt_date(d: date, lang: str = "ru") -> str:
     """e.g. 'Вторник 24/02/2026'"""
-    return f"{_DAYS_LONG[lang][d.weekday()]} {d.strftime('%d/%m/%Y')}"
+    return f"{_DAYS_LONG[lang][d.weekday()]} {d.day:02d}/{d.month:02d}/{d.year}"
 
 
 def _fmt_date_short(d: date, lang: str = "ru") -> str:
     """e.g. 'Вт 24/02' — used in compact keyboard buttons"""
-    return f"{_DAYS_SHORT[lang][d.weekday()]} {d.strftime('%d/%m')}"
+    return f"{_DAYS_SHORT[lang][d.weekday()]} {d.day:02d}/{d.month:02d}"
 
 
 def _fmt_time_range(start_time: str, n_slots: int) -> str:
     """e.g. '10:30–12:00' (n_slots × 30 min each)"""
-    h, m    = int(start_time.split(":")[0]), int(start_time.split(":")[1])
+    h, m    = _hm(start_time)
     end_min = h * 60 + m + n_slots * 30
     return f"{start_time}–{end_min // 60:02d}:{end_min % 60:02d}"
 
@@ -757,6 +994,7 @@ MENU_BOOK_TEXTS = {STRINGS["ru"]["menu_book"], STRINGS["uz"]["menu_book"]}
 MENU_LANG_TEXTS = {STRINGS["ru"]["menu_lang"], STRINGS["uz"]["menu_lang"]}
 
 
+@lru_cache(maxsize=None)
 def _main_menu_kb(lang: str) -> ReplyKeyboardMarkup:
     """Persistent two-button keyboard shown below the message input."""
     if MINIAPP_ENABLED and MINIAPP_URL:
@@ -792,26 +1030,30 @@ def _load_services() -> dict[str, dict[str, Any]]:
 
 SERVICES: dict[str, dict[str, Any]] = _load_services()
 
-
-def _svc_label(svc_id: str, lang: str) -> str:
-    """Full label with price — for barber."""
-    return SERVICES[svc_id][lang]
+# Flat per-field views of SERVICES — one dict hop per service in the helpers below.
+_SVC_MINS:  dict[str, int] = {k: v["mins"] for k, v in SERVICES.items()}
+_SVC_PRICE: dict[str, int] = {k: v.get("price_uzs", 0) for k, v in SERVICES.items()}
+_SVC_CLIENT_LABELS: dict[str, dict[str, str]] = {
+    lang: {k: v.get(f"{lang}_c", v[lang]) for k, v in SERVICES.items()}
+    for lang in ("ru", "uz")
+}
+_SVC_LABEL_RU: dict[str, str] = {k: v["ru"] for k, v in SERVICES.items()}
 
 
 def _svc_client_label(svc_id: str, lang: str) -> str:
     """Label without price — for clients."""
-    return SERVICES[svc_id].get(f"{lang}_c", SERVICES[svc_id][lang])
+    return _SVC_CLIENT_LABELS[lang][svc_id]
 
 
 def _calc_duration(service_ids: list[str]) -> tuple[int, int]:
     """Return (total_minutes, 30-min_slots_needed)."""
-    mins  = sum(SERVICES[s]["mins"] for s in service_ids if s in SERVICES)
-    slots = max(1, math.ceil(mins / 30))
+    mins  = sum(_SVC_MINS.get(s, 0) for s in service_ids)
+    slots = max(1, (mins + 29) // 30)
     return mins, slots
 
 
 def _calc_total_price(service_ids: list[str]) -> int:
-    return sum(SERVICES[s].get("price_uzs", 0) for s in service_ids if s in SERVICES)
+    return sum(_SVC_PRICE.get(s, 0) for s in service_ids)
 
 
 def _price_line(price: int, lang: str) -> str:
@@ -825,6 +1067,11 @@ def _price_line(price: int, lang: str) -> str:
 
 
 # ─────────────────────────── In-memory storage ───────────────────────────────
+# This process owns all booking state: the dicts below are the source of truth
+# and SQLite is their write-behind copy, so the bot is deployed as a single
+# process (webhook or polling) and multiple replicas are not supported.  Every
+# write goes through the _store_* / _drop_* / _update_customer helpers, which
+# are the single seam to swap if state ever has to be shared between processes.
 appointments:    dict[str, dict[str, Any]] = {}   # "YYYY-MM-DD HH:MM" → booking
 pending_bookings: dict[int, dict[str, Any]] = {}   # booking_id → booking
 _pending_counter = 0
@@ -839,94 +1086,341 @@ def _next_id() -> int:
     return _pending_counter
 
 
-def _all_taken_slots(exclude_slot_key: str | None = None) -> set[str]:
-    taken: set[str] = set(blocked_slots)   # barber-blocked slots always taken
+# Every change to appointments / pending_bookings / blocked_slots goes through
+# these helpers so the taken-slot index and per-user indexes stay in sync.
+
+# user_id → slot_keys in appointments / bids in pending_bookings
+_user_slots: dict[int, set[str]] = {}
+_user_bids:  dict[int, set[int]] = {}
+
+# "YYYY-MM-DD" / "YYYY-MM-DD HH:MM" → bids in pending_bookings
+_pending_by_day:  dict[str, set[int]] = {}
+_pending_by_slot: dict[str, set[int]] = {}
+
+# Keys of appointments / blocked_slots in order — "YYYY-MM-DD HH:MM" strings
+# sort chronologically, so "from now on" is a bisect.
+_appt_keys:    SortedList = SortedList()
+_blocked_keys: SortedList = SortedList()
+
+
+def _index_add(index: dict[Any, set], owner: Any, key: Any) -> None:
+    if owner is not None:
+        index.setdefault(owner, set()).add(key)
+
+
+def _index_remove(index: dict[Any, set], owner: Any, key: Any) -> None:
+    keys = index.get(owner)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[owner]
+
+
+def _store_appointment(slot_key: str, bk: dict[str, Any]) -> None:
+    if slot_key in appointments:
+        _drop_appointment(slot_key)
+    appointments[slot_key] = bk
+    _appt_keys.add(slot_key)
+    _add_taken(_expand(slot_key, bk))
+    _index_add(_user_slots, bk.get("user_id"), slot_key)
+
+
+def _drop_appointment(slot_key: str) -> dict[str, Any]:
+    bk = appointments.pop(slot_key)
+    _appt_keys.remove(slot_key)
+    _remove_taken(_expand(slot_key, bk))
+    _index_remove(_user_slots, bk.get("user_id"), slot_key)
+    return bk
+
+
+def _store_pending(bid: int, bk: dict[str, Any]) -> None:
+    if bid in pending_bookings:
+        _drop_pending(bid)
+    pending_bookings[bid] = bk
+    _add_taken(_expand(bk["slot_key"], bk))
+    _index_add(_user_bids, bk.get("user_id"), bid)
+    _index_add(_pending_by_day, bk["slot_key"][:10], bid)
+    _index_add(_pending_by_slot, bk["slot_key"], bid)
+
+
+def _drop_pending(bid: int) -> dict[str, Any]:
+    bk = pending_bookings.pop(bid)
+    _remove_taken(_expand(bk["slot_key"], bk))
+    _index_remove(_user_bids, bk.get("user_id"), bid)
+    _index_remove(_pending_by_day, bk["slot_key"][:10], bid)
+    _index_remove(_pending_by_slot, bk["slot_key"], bid)
+    return bk
+
+
+def _update_customer(uid: int, **fields: str) -> None:
+    customer_cache.setdefault(uid, {}).update(fields)
+    _db_save_customer(uid)
+
+
+def _block_slot(slot_key: str) -> None:
+    if slot_key not in blocked_slots:
+        blocked_slots.add(slot_key)
+        _blocked_keys.add(slot_key)
+        _add_taken((_slot_code(slot_key),))
+
+
+def _unblock_slot(slot_key: str) -> None:
+    if slot_key in blocked_slots:
+        blocked_slots.discard(slot_key)
+        _blocked_keys.remove(slot_key)
+        _remove_taken((_slot_code(slot_key),))
+
+
+# ─────────────────────────── Taken-slot index ────────────────────────────────
+# Taken slots are integer codes  date.toordinal() * 1440 + minute_of_day,
+# so membership checks need no string formatting.  _taken_counts is a live
+# multiset (a blocked slot may also sit under a booking) maintained by the
+# mutators above; only exclude_slot_key lookups build a new set, and those
+# are cached until the next mutation.
+#
+# _day_masks mirrors the same data per day: bit i of _day_masks[ordinal] is
+# set while the slot starting at minute i*30 is taken, so a run of n slots is
+# checked with one AND.
+
+_taken_counts: Counter[int] = Counter()
+_day_masks: dict[int, int] = {}
+_taken_version = 0
+_taken_cache: tuple[int, str | None, frozenset[int]] = (-1, None, frozenset())
+
+
+@lru_cache(maxsize=4096)
+def _slot_code(slot_key: str) -> int:
+    """'2026-02-24 10:30' → ordinal-minute code."""
+    return (date.fromisoformat(slot_key[:10]).toordinal() * 1440
+            + int(slot_key[11:13]) * 60 + int(slot_key[14:16]))
+
+
+def _expand(slot_key: str, bk: dict[str, Any]) -> range:
+    """Codes of every 30-min slot a booking occupies."""
+    start = _slot_code(slot_key)
+    return range(start, start + bk.get("duration_slots", 1) * 30, 30)
+
+
+def _set_bit(code: int) -> None:
+    day, minute = divmod(code, 1440)
+    _day_masks[day] = _day_masks.get(day, 0) | (1 << minute // 30)
+
+
+def _clear_bit(code: int) -> None:
+    day, minute = divmod(code, 1440)
+    mask = _day_masks.get(day, 0) & ~(1 << minute // 30)
+    if mask:
+        _day_masks[day] = mask
+    else:
+        _day_masks.pop(day, None)
+
+
+def _add_taken(codes: Iterable[int]) -> None:
+    global _taken_version
+    for code in codes:
+        if code not in _taken_counts:
+            _set_bit(code)
+        _taken_counts[code] += 1
+    _taken_version += 1
+
+
+def _remove_taken(codes: Iterable[int]) -> None:
+    global _taken_version
+    for code in codes:
+        if _taken_counts[code] <= 1:
+            del _taken_counts[code]
+            _clear_bit(code)
+        else:
+            _taken_counts[code] -= 1
+    _taken_version += 1
+
+
+def _rebuild_indexes() -> None:
+    """Recompute the taken-slot, per-user and ordered indexes (after hydrating from the DB)."""
+    global _taken_version
+    _taken_counts.clear()
+    _day_masks.clear()
+    _user_slots.clear()
+    _user_bids.clear()
+    _pending_by_day.clear()
+    _pending_by_slot.clear()
+    _appt_keys.clear()
+    _appt_keys.update(appointments)
+    _blocked_keys.clear()
+    _blocked_keys.update(blocked_slots)
+    _taken_counts.update(_slot_code(k) for k in blocked_slots)
     for slot_key, bk in appointments.items():
-        if slot_key == exclude_slot_key:
-            continue
-        d_str, t_str = slot_key.split(" ")
-        h, m = int(t_str[:2]), int(t_str[3:5])
-        start_min = h * 60 + m
-        for i in range(bk.get("duration_slots", 1)):
-            sm = start_min + i * 30
-            taken.add(f"{d_str} {sm // 60:02d}:{sm % 60:02d}")
-    for bk in pending_bookings.values():
-        if bk["slot_key"] == exclude_slot_key:
-            continue
-        d_str, t_str = bk["slot_key"].split(" ")
-        h, m = int(t_str[:2]), int(t_str[3:5])
-        start_min = h * 60 + m
-        for i in range(bk.get("duration_slots", 1)):
-            sm = start_min + i * 30
-            taken.add(f"{d_str} {sm // 60:02d}:{sm % 60:02d}")
-    return taken
+        _taken_counts.update(_expand(slot_key, bk))
+        _index_add(_user_slots, bk.get("user_id"), slot_key)
+    for bid, bk in pending_bookings.items():
+        _taken_counts.update(_expand(bk["slot_key"], bk))
+        _index_add(_user_bids, bk.get("user_id"), bid)
+        _index_add(_pending_by_day, bk["slot_key"][:10], bid)
+        _index_add(_pending_by_slot, bk["slot_key"], bid)
+    for code in _taken_counts:
+        _set_bit(code)
+    _taken_version += 1
+
+
+def _all_taken_slots(exclude_slot_key: str | None = None) -> AbstractSet[int]:
+    if exclude_slot_key is None:
+        return _taken_counts.keys()
+
+    global _taken_cache
+    version, cached_exclude, cached = _taken_cache
+    if version == _taken_version and cached_exclude == exclude_slot_key:
+        return cached
+
+    # Subtract the excluded booking's own slots, unless something else
+    # (a blocked slot, another booking) holds them too.
+    excluded: Counter[int] = Counter()
+    if exclude_slot_key in appointments:
+        excluded.update(_expand(exclude_slot_key, appointments[exclude_slot_key]))
+    for bid in _pending_by_slot.get(exclude_slot_key, ()):
+        excluded.update(_expand(exclude_slot_key, pending_bookings[bid]))
+    result = frozenset(
+        code for code in _taken_counts if _taken_counts[code] > excluded[code]
+    )
+    _taken_cache = (_taken_version, exclude_slot_key, result)
+    return result
+
+
+def _taken_mask(day: int, exclude_slot_key: str | None = None) -> int:
+    """Taken-slot bitmask for date ordinal *day* (bit i = minute i*30)."""
+    if exclude_slot_key is None:
+        return _day_masks.get(day, 0)
+    taken = _all_taken_slots(exclude_slot_key)
+    day_code = day * 1440
+    mask = 0
+    for bit in range(48):
+        if day_code + bit * 30 in taken:
+            mask |= 1 << bit
+    return mask
 
 
 # ─────────────────────────── Translation helper ──────────────────────────────
 
 def _lang(uid: int) -> str:
-    return customer_cache.get(uid, {}).get("lang", "ru")
+    entry = customer_cache.get(uid)
+    return entry.get("lang", "ru") if entry else "ru"
+
+
+# (lang, key) → template, with the Russian text filled in for keys a language lacks
+_TEMPLATES: dict[tuple[str, str], str] = {
+    (lang, key): table[key] if key in table else STRINGS["ru"][key]
+    for lang, table in STRINGS.items()
+    for key in STRINGS["ru"].keys() | table.keys()
+}
 
 
 def tx(uid: int, key: str, **kwargs: Any) -> str:
-    lang = _lang(uid)
-    text = STRINGS[lang].get(key, STRINGS["ru"].get(key, key))
-    return text.format(**kwargs) if kwargs else text
+    return _tx(_lang(uid), key, **kwargs)
+
+
+def _tx(lang: str, key: str, **kwargs: Any) -> str:
+    """tx() for handlers that already resolved the user's language."""
+    text = _TEMPLATES.get((lang, key), key)
+    return text.format_map(kwargs) if kwargs else text
+
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def _plain(text: str) -> str:
+    """Strip HTML tags — for popup alerts, which are not parsed."""
+    return _TAG_RE.sub("", text)
 
 
 # ─────────────────────────── Slot / date helpers ─────────────────────────────
 
+# (monotonic time taken, today, minute of day) — keyboard renders within a
+# few seconds of each other share one clock reading.
+_NOW_TTL = 10.0
+_now_cache: tuple[float, date, int] = (float("-inf"), date.min, 0)
+
+
+def _now_snapshot() -> tuple[date, int]:
+    global _now_cache
+    t = time.monotonic()
+    if t - _now_cache[0] >= _NOW_TTL:
+        now        = datetime.now(tz=TZ)
+        _now_cache = (t, now.date(), now.hour * 60 + now.minute)
+    return _now_cache[1], _now_cache[2]
+
+
+@lru_cache(maxsize=4096)
+def _parse_slot(slot_key: str) -> datetime:
+    """'2026-02-24 10:30' → tz-aware datetime (Asia/Tashkent)."""
+    return datetime.fromisoformat(slot_key).replace(tzinfo=TZ)
+
+
+# Slot callbacks carry the key as a fixed-width "YYYY-MM-DD_HH:MM" payload,
+# so both directions are slices.
+def _slot_cb(slot_key: str) -> str:
+    """'2026-02-24 10:30' → '2026-02-24_10:30' (callback-data payload)."""
+    return f"{slot_key[:10]}_{slot_key[11:]}"
+
+
+def _cb_slot(payload: str) -> str:
+    """'2026-02-24_10:30' → '2026-02-24 10:30'."""
+    return f"{payload[:10]} {payload[11:]}"
+
+
 def _working_dates() -> list[date]:
-    today  = datetime.now(tz=TZ).date()
+    today, _ = _now_snapshot()
     result: list[date] = []
     cursor = today
     while len(result) < DAYS_AHEAD:
-        if cursor.weekday() in schedule_config["work_days"]:
+        if cursor.weekday() in WORK_DAYS:
             result.append(cursor)
         cursor += timedelta(days=1)
     return result
 
 
 def _available_slots(for_date: date, exclude_slot_key: str | None = None) -> list[str]:
-    now       = datetime.now(tz=TZ)
-    taken     = _all_taken_slots(exclude_slot_key=exclude_slot_key)
-    slots     = []
-    start_min = schedule_config["start_hour"] * 60
-    end_min   = schedule_config["end_hour"] * 60
-    for sm in range(start_min, end_min, 30):
-        h, m     = sm // 60, sm % 60
-        slot_dt  = datetime(for_date.year, for_date.month, for_date.day, h, m, tzinfo=TZ)
-        slot_key = f"{for_date.isoformat()} {h:02d}:{m:02d}"
-        if slot_dt > now and slot_key not in taken:
-            slots.append(f"{h:02d}:{m:02d}")
-    return slots
+    today, now_min = _now_snapshot()
+    if for_date < today:
+        return []
+    if for_date > today:
+        now_min = -1     # future dates have no cutoff
+    first = max(START_HOUR * 2, now_min // 30 + 1)
+    free  = ((1 << END_HOUR * 2) - (1 << first)) if first < END_HOUR * 2 else 0
+    free &= ~_taken_mask(for_date.toordinal(), exclude_slot_key)
+    result = []
+    while free:
+        low = free & -free
+        result.append(_SLOT_STRINGS[low.bit_length() - 1])
+        free ^= low
+    return result
 
 
 def _overflow_minutes(start_time: str, n_slots: int) -> int:
     """Minutes by which booking exceeds end_hour.  0 = fits within schedule."""
-    h, m      = int(start_time.split(":")[0]), int(start_time.split(":")[1])
-    end_min   = schedule_config["end_hour"] * 60
+    h, m      = _hm(start_time)
+    end_min   = END_HOUR * 60
     return max(0, h * 60 + m + n_slots * 30 - end_min)
 
 
 def _can_fit(for_date: date, start_time: str, n_slots: int,
              *, allow_overflow: bool = False) -> bool:
-    h, m      = int(start_time.split(":")[0]), int(start_time.split(":")[1])
+    h, m      = _hm(start_time)
     start_min = h * 60 + m
-    end_min   = schedule_config["end_hour"] * 60
+    end_min   = END_HOUR * 60
     if start_min + n_slots * 30 > end_min and not allow_overflow:
         return False
-    taken = _all_taken_slots()
-    iso   = for_date.isoformat()
-    for i in range(n_slots):
-        sm = start_min + i * 30
-        if f"{iso} {sm // 60:02d}:{sm % 60:02d}" in taken:
-            return False
-    return True
+    day  = for_date.toordinal()
+    # Overflow past midnight spills into the next day's bits.
+    mask = _day_masks.get(day, 0) | (_day_masks.get(day + 1, 0) << 48)
+    run  = ((1 << n_slots) - 1) << (start_min // 30)
+    return not mask & run
 
 
 # ─────────────────────────── Keyboard builders ───────────────────────────────
 
+# Keyboards that depend only on their arguments are memoized — PTB markups are
+# immutable, so one instance can be sent to any number of chats.
+
+@lru_cache(maxsize=None)
 def _lang_keyboard(prefix: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([[
         InlineKeyboardButton("🇷🇺 Русский", callback_data=f"{prefix}ru"),
@@ -936,7 +1430,16 @@ def _lang_keyboard(prefix: str) -> InlineKeyboardMarkup:
 
 def _date_keyboard(lang: str, date_prefix: str = "date",
                    cancel_data: str = "cancel") -> InlineKeyboardMarkup:
-    today    = datetime.now(tz=TZ).date()
+    # The markup only changes at midnight or when /config edits the work days.
+    today, _ = _now_snapshot()
+    return _build_date_keyboard(today.toordinal(), lang, date_prefix, cancel_data,
+                                _config_version)
+
+
+@lru_cache(maxsize=32)
+def _build_date_keyboard(today_ordinal: int, lang: str, date_prefix: str,
+                         cancel_data: str, cfg_version: int) -> InlineKeyboardMarkup:
+    today    = date.fromordinal(today_ordinal)
     tomorrow = today + timedelta(days=1)
     rows = []
     for d in _working_dates():
@@ -960,12 +1463,26 @@ def _time_keyboard(for_date: date, lang: str,
     slots = _available_slots(for_date, exclude_slot_key=exclude_slot_key)
     if not slots:
         return None
+    # Keyed on the free slots themselves, so bookings, /config edits and the
+    # passing of time need no explicit invalidation.
+    return _build_time_keyboard(tuple(slots), lang, time_prefix, back_data, cancel_data)
 
+
+@lru_cache(maxsize=256)
+def _build_time_keyboard(slots: tuple[str, ...], lang: str, time_prefix: str,
+                         back_data: str, cancel_data: str) -> InlineKeyboardMarkup:
+    strings = STRINGS[lang]
     # Group slots by time of day
+    morning: list[str] = []
+    afternoon: list[str] = []
+    evening: list[str] = []
+    for s in slots:
+        h = _SLOT_META[s][0]
+        (morning if h < 12 else afternoon if h < 17 else evening).append(s)
     groups = [
-        (STRINGS[lang]["morning"],   [s for s in slots if int(s[:2]) < 12]),
-        (STRINGS[lang]["afternoon"], [s for s in slots if 12 <= int(s[:2]) < 17]),
-        (STRINGS[lang]["evening"],   [s for s in slots if int(s[:2]) >= 17]),
+        (strings["morning"],   morning),
+        (strings["afternoon"], afternoon),
+        (strings["evening"],   evening),
     ]
 
     rows: list[list[InlineKeyboardButton]] = []
@@ -985,27 +1502,47 @@ def _time_keyboard(for_date: date, lang: str,
             rows.append(row)
 
     rows.append([
-        InlineKeyboardButton(STRINGS[lang]["btn_back"],   callback_data=back_data),
-        InlineKeyboardButton(STRINGS[lang]["btn_cancel"], callback_data=cancel_data),
+        InlineKeyboardButton(strings["btn_back"],   callback_data=back_data),
+        InlineKeyboardButton(strings["btn_cancel"], callback_data=cancel_data),
     ])
     return InlineKeyboardMarkup(rows)
 
 
+# Per-language (svc_id, plain button, ticked button) triples, in catalogue
+# order.  A toggle only picks the other prebuilt button for the tapped row,
+# so no InlineKeyboardButton is constructed per tap.
+_SVC_BUTTONS: dict[str, list[tuple[str, InlineKeyboardButton, InlineKeyboardButton]]] = {}
+_SVC_DONE_ROW: dict[str, list[InlineKeyboardButton]] = {}
+for _l in STRINGS:
+    _SVC_BUTTONS[_l] = []
+    for _svc_id, _label in _SVC_CLIENT_LABELS[_l].items():
+        _label = f"{_label}  ({_SVC_MINS[_svc_id]} {STRINGS[_l]['svc_dur_min']})"
+        _SVC_BUTTONS[_l].append((
+            _svc_id,
+            InlineKeyboardButton(_label,      callback_data=_svc_id),
+            InlineKeyboardButton(f"✓ {_label}", callback_data=_svc_id),
+        ))
+    _SVC_DONE_ROW[_l] = [
+        InlineKeyboardButton(STRINGS[_l]["btn_done"],   callback_data="services_done"),
+        InlineKeyboardButton(STRINGS[_l]["btn_cancel"], callback_data="cancel"),
+    ]
+
+
 def _services_keyboard(selected: set[str], lang: str) -> InlineKeyboardMarkup:
-    dur_unit = STRINGS[lang]["svc_dur_min"]
-    rows = []
-    for svc_id in SERVICES:
-        tick = "✓ " if svc_id in selected else ""
-        mins = SERVICES[svc_id]["mins"]
-        label = f"{tick}{_svc_client_label(svc_id, lang)}  ({mins} {dur_unit})"
-        rows.append([InlineKeyboardButton(label, callback_data=svc_id)])
-    rows.append([
-        InlineKeyboardButton(STRINGS[lang]["btn_done"],   callback_data="services_done"),
-        InlineKeyboardButton(STRINGS[lang]["btn_cancel"], callback_data="cancel"),
-    ])
+    return _build_services_keyboard(frozenset(selected), lang)
+
+
+@lru_cache(maxsize=128)
+def _build_services_keyboard(selected: frozenset[str], lang: str) -> InlineKeyboardMarkup:
+    rows = [
+        [ticked if svc_id in selected else plain]
+        for svc_id, plain, ticked in _SVC_BUTTONS[lang]
+    ]
+    rows.append(_SVC_DONE_ROW[lang])
     return InlineKeyboardMarkup(rows)
 
 
+@lru_cache(maxsize=None)
 def _confirm_keyboard(lang: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([[
         InlineKeyboardButton(STRINGS[lang]["btn_confirm"], callback_data="confirm_yes"),
@@ -1013,6 +1550,14 @@ def _confirm_keyboard(lang: str) -> InlineKeyboardMarkup:
     ]])
 
 
+@lru_cache(maxsize=None)
+def _cancel_only_keyboard(lang: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(STRINGS[lang]["btn_cancel"], callback_data="cancel"),
+    ]])
+
+
+@lru_cache(maxsize=None)
 def _phone_keyboard(lang: str) -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         [
@@ -1023,6 +1568,7 @@ def _phone_keyboard(lang: str) -> ReplyKeyboardMarkup:
     )
 
 
+@lru_cache(maxsize=None)
 def _barber_phone_keyboard(lang: str) -> ReplyKeyboardMarkup:
     """Phone step when the barber books a walk-in: type or skip, no share-contact."""
     return ReplyKeyboardMarkup(
@@ -1041,6 +1587,47 @@ def _approval_keyboard(booking_id: int) -> InlineKeyboardMarkup:
     ]])
 
 
+# ─────────────────────────── Message edits ───────────────────────────────────
+
+# A flood-wait (HTTP 429) is never slept off inside a handler — updates are
+# processed one at a time, so that would stall the bot for everyone.  The edit
+# is retried once in the background instead, or dropped if the wait is long.
+_EDIT_RETRY_CAP = 5                         # seconds
+# (chat_id, message_id) → pending retry; entries leave once the retry ends.
+_edit_retries: dict[tuple[int, int], asyncio.Task] = {}
+
+
+async def _safe_edit(query, *args, **kwargs) -> None:
+    """query.edit_message_text, with a capped background retry after a 429."""
+    key   = (query.message.chat_id, query.message.message_id)
+    stale = _edit_retries.pop(key, None)
+    if stale is not None:
+        stale.cancel()                      # a newer edit supersedes it
+    try:
+        await query.edit_message_text(*args, **kwargs)
+    except RetryAfter as exc:
+        if exc.retry_after > _EDIT_RETRY_CAP:
+            logger.warning("Flood limit: dropping edit (retry after %ss)", exc.retry_after)
+            return
+        task = asyncio.get_running_loop().create_task(
+            _retry_edit(key, exc.retry_after, query, args, kwargs)
+        )
+        _edit_retries[key] = task
+
+
+async def _retry_edit(key: tuple[int, int], wait: float, query,
+                      args: tuple, kwargs: dict) -> None:
+    try:
+        await asyncio.sleep(wait)
+        await query.edit_message_text(*args, **kwargs)
+    except asyncio.CancelledError:
+        return                              # superseded by a newer edit
+    except Exception as exc:
+        logger.warning("Edit retry failed: %s", exc)
+    if _edit_retries.get(key) is asyncio.current_task():
+        del _edit_retries[key]
+
+
 # ─────────────────────────── FSM states ──────────────────────────────────────
 (
     STATE_LANG,
@@ -1053,6 +1640,28 @@ def _approval_keyboard(booking_id: int) -> InlineKeyboardMarkup:
 ) = range(7)
 
 
+@dataclass(slots=True)
+class BookingDraft:
+    """Answers collected by the booking conversation (user_data["draft"])."""
+    date:           date | None = None
+    time:           str | None  = None
+    name:           str         = ""
+    phone:          str         = ""
+    services:       set[str]    = field(default_factory=set)
+    barber_booking: bool        = False      # barber entering a walk-in
+    duration_slots: int         = 1
+    duration_mins:  int         = 30
+    time_range:     str | None  = None
+    overflow_mins:  int         = 0
+
+
+def _draft(context: ContextTypes.DEFAULT_TYPE) -> BookingDraft:
+    draft = context.user_data.get("draft")
+    if draft is None:
+        draft = context.user_data["draft"] = BookingDraft()
+    return draft
+
+
 # ─────────────────────────── /start  /cancel ─────────────────────────────────
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -1169,8 +1778,8 @@ async def cmd_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 async def _cancel_cb(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data.clear()
-    await update.callback_query.edit_message_text(
-        tx(update.effective_user.id, "booking_cancel")
+    await _safe_edit(
+        update.callback_query, tx(update.effective_user.id, "booking_cancel")
     )
     return ConversationHandler.END
 
@@ -1206,10 +1815,9 @@ async def cb_setlang(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     await query.answer()
     uid  = update.effective_user.id
     lang = query.data.split("_")[-1]              # "setlang_ru" → "ru"
-    customer_cache.setdefault(uid, {})["lang"] = lang
-    _db_save_customer(uid)
+    _update_customer(uid, lang=lang)
     key  = f"lang_changed_{lang}"
-    await query.edit_message_text(STRINGS[lang].get(key, "✅"))
+    await _safe_edit(query, STRINGS[lang].get(key, "✅"))
     await query.message.reply_text("👇", reply_markup=_main_menu_kb(lang))
 
 
@@ -1220,10 +1828,9 @@ async def cb_lang_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await query.answer()
     uid  = update.effective_user.id
     lang = query.data.split("_")[-1]              # "lang_ru" → "ru"
-    customer_cache.setdefault(uid, {})["lang"] = lang
-    _db_save_customer(uid)
-    await query.edit_message_text(
-        tx(uid, "welcome", name=update.effective_user.first_name),
+    _update_customer(uid, lang=lang)
+    await _safe_edit(
+        query, tx(uid, "welcome", name=update.effective_user.first_name),
         parse_mode="HTML",
         reply_markup=_date_keyboard(lang),
     )
@@ -1234,27 +1841,26 @@ async def cb_lang_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
 async def cb_date_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
-    await query.answer()
     uid  = update.effective_user.id
     lang = _lang(uid)
 
     if query.data == "cancel":
+        await query.answer()
         return await _cancel_cb(update, context)
 
     chosen = date.fromisoformat(query.data.split("_", 1)[1])
-    context.user_data["date"] = chosen
+    _draft(context).date = chosen
 
     kb = _time_keyboard(chosen, lang)
     if kb is None:
-        await query.edit_message_text(
-            tx(uid, "no_slots", date=_fmt_date(chosen, lang)),
-            parse_mode="HTML",
-            reply_markup=_date_keyboard(lang),
-        )
+        # The date picker is still on screen — just pop an alert over it.
+        await query.answer(_plain(_tx(lang, "no_slots", date=_fmt_date(chosen, lang))),
+                           show_alert=True)
         return STATE_DATE
 
-    await query.edit_message_text(
-        tx(uid, "date_selected", date=_fmt_date(chosen, lang)),
+    await query.answer()
+    await _safe_edit(
+        query, _tx(lang, "date_selected", date=_fmt_date(chosen, lang)),
         parse_mode="HTML",
         reply_markup=kb,
     )
@@ -1273,46 +1879,45 @@ async def cb_time_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         return await _cancel_cb(update, context)
 
     if query.data == "back_to_date":
-        await query.edit_message_text(
-            tx(uid, "choose_date"), reply_markup=_date_keyboard(lang)
+        await _safe_edit(
+            query, _tx(lang, "choose_date"), reply_markup=_date_keyboard(lang)
         )
         return STATE_DATE
 
+    draft    = _draft(context)
     t        = query.data.split("_", 1)[1]      # "09:00"
-    slot_key = f"{context.user_data['date'].isoformat()} {t}"
-    context.user_data["time"] = t
+    slot_key = f"{draft.date.isoformat()} {t}"
+    draft.time = t
 
-    if slot_key in _all_taken_slots():
-        await query.edit_message_text(
-            tx(uid, "slot_taken"),
-            reply_markup=_time_keyboard(context.user_data["date"], lang),
+    if _slot_code(slot_key) in _all_taken_slots():
+        await _safe_edit(
+            query, _tx(lang, "slot_taken"),
+            reply_markup=_time_keyboard(draft.date, lang),
         )
         return STATE_TIME
 
-    context.user_data["services"] = set()
+    draft.services = set()
 
     # Barber booking a walk-in → always capture the real client's name/phone,
     # never reuse the barber's own cached identity.
     is_barber = _is_barber(uid)
-    context.user_data["barber_booking"] = is_barber
+    draft.barber_booking = is_barber
 
     cached = customer_cache.get(uid, {})
     if not is_barber and "name" in cached and "phone" in cached:
-        context.user_data.update(name=cached["name"], phone=cached["phone"])
-        await query.edit_message_text(
-            tx(uid, "welcome_back", time=t, name=cached["name"]),
+        draft.name, draft.phone = cached["name"], cached["phone"]
+        await _safe_edit(
+            query, _tx(lang, "welcome_back", time=t, name=cached["name"]),
             parse_mode="HTML",
             reply_markup=_services_keyboard(set(), lang),
         )
         return STATE_SERVICES
 
-    prompt = tx(uid, "enter_client_name", time=t) if is_barber else tx(uid, "enter_name", time=t)
-    await query.edit_message_text(
-        prompt,
+    prompt = _tx(lang, "enter_client_name", time=t) if is_barber else _tx(lang, "enter_name", time=t)
+    await _safe_edit(
+        query, prompt,
         parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup([[
-            InlineKeyboardButton(STRINGS[lang]["btn_cancel"], callback_data="cancel"),
-        ]]),
+        reply_markup=_cancel_only_keyboard(lang),
     )
     return STATE_NAME
 
@@ -1325,19 +1930,20 @@ async def handle_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     name = update.message.text.strip()
 
     if len(name) < 2:
-        await update.message.reply_text(tx(uid, "invalid_name"))
+        await update.message.reply_text(_tx(lang, "invalid_name"))
         return STATE_NAME
 
-    context.user_data["name"] = name
-    if context.user_data.get("barber_booking"):
+    draft = _draft(context)
+    draft.name = name
+    if draft.barber_booking:
         await update.message.reply_text(
-            tx(uid, "enter_client_phone"),
+            _tx(lang, "enter_client_phone"),
             parse_mode="HTML",
             reply_markup=_barber_phone_keyboard(lang),
         )
     else:
         await update.message.reply_text(
-            tx(uid, "enter_phone", name=name),
+            _tx(lang, "enter_phone", name=name),
             parse_mode="HTML",
             reply_markup=_phone_keyboard(lang),
         )
@@ -1346,6 +1952,9 @@ async def handle_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 
 # ─────────────────────────── STATE_PHONE ─────────────────────────────────────
 
+_DIGIT_DEL = str.maketrans("", "", "0123456789")
+
+
 async def handle_phone_contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     phone = update.message.contact.phone_number
     if not phone.startswith("+"):
@@ -1361,19 +1970,19 @@ async def handle_phone_text(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if phone in (STRINGS["ru"]["btn_cancel"], STRINGS["uz"]["btn_cancel"]):
         context.user_data.clear()
         await update.message.reply_text(
-            tx(uid, "flow_cancelled"),
+            _tx(lang, "flow_cancelled"),
             parse_mode="HTML",
             reply_markup=ReplyKeyboardRemove(),
         )
         return ConversationHandler.END
     # Barber may skip the walk-in client's phone
-    if context.user_data.get("barber_booking") and phone in (
+    if _draft(context).barber_booking and phone in (
         STRINGS["ru"]["btn_skip"], STRINGS["uz"]["btn_skip"]
     ):
         return await _after_phone(update, context, "—")
-    if len("".join(c for c in phone if c.isdigit())) < 7:
+    if len(phone) - len(phone.translate(_DIGIT_DEL)) < 7:     # fewer than 7 digits
         await update.message.reply_text(
-            tx(uid, "invalid_phone"), reply_markup=_phone_keyboard(lang)
+            _tx(lang, "invalid_phone"), reply_markup=_phone_keyboard(lang)
         )
         return STATE_PHONE
     return await _after_phone(update, context, phone)
@@ -1384,13 +1993,13 @@ async def _after_phone(
 ) -> int:
     uid  = update.effective_user.id
     lang = _lang(uid)
-    context.user_data["phone"] = phone
+    _draft(context).phone = phone
     await update.message.reply_text(
-        tx(uid, "phone_saved", phone=phone),
+        _tx(lang, "phone_saved", phone=phone),
         reply_markup=ReplyKeyboardRemove(),
     )
     await update.message.reply_text(
-        tx(uid, "select_svc"),
+        _tx(lang, "select_svc"),
         reply_markup=_services_keyboard(set(), lang),
     )
     return STATE_SERVICES
@@ -1400,54 +2009,56 @@ async def _after_phone(
 
 async def cb_service_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
-    await query.answer()
     uid      = update.effective_user.id
     lang     = _lang(uid)
-    selected: set[str] = context.user_data.setdefault("services", set())
+    draft    = _draft(context)
+    selected = draft.services
+
+    if query.data == "services_done" and not selected:
+        await query.answer(_tx(lang, "min_one_svc"), show_alert=True)
+        return STATE_SERVICES
+    await query.answer()
 
     if query.data == "cancel":
         return await _cancel_cb(update, context)
 
     if query.data in SERVICES:
         selected.discard(query.data) if query.data in selected else selected.add(query.data)
-        await query.edit_message_text(
-            tx(uid, "select_svc"),
+        # The prompt text never changes here — only swap the keyboard.
+        await query.edit_message_reply_markup(
             reply_markup=_services_keyboard(selected, lang),
         )
         return STATE_SERVICES
 
     if query.data == "services_done":
-        if not selected:
-            await query.answer(tx(uid, "min_one_svc"), show_alert=True)
-            return STATE_SERVICES
-
-        d          = context.user_data["date"]
-        t          = context.user_data["time"]
-        name       = context.user_data["name"]
-        phone      = context.user_data["phone"]
+
+        d          = draft.date
+        t          = draft.time
+        name       = draft.name
+        phone      = draft.phone
         total_mins, n_slots = _calc_duration(list(selected))
 
         if not _can_fit(d, t, n_slots, allow_overflow=True):
-            await query.edit_message_text(
-                tx(uid, "no_consec", n=total_mins),
+            await _safe_edit(
+                query, _tx(lang, "no_consec", n=total_mins),
                 parse_mode="HTML",
                 reply_markup=_time_keyboard(d, lang),
             )
-            context.user_data.pop("services", None)
+            draft.services = set()
             return STATE_TIME
 
         overflow = _overflow_minutes(t, n_slots)
         time_range = _fmt_time_range(t, n_slots)
-        context.user_data["duration_slots"] = n_slots
-        context.user_data["duration_mins"]  = total_mins
-        context.user_data["time_range"]     = time_range
-        context.user_data["overflow_mins"]  = overflow
+        draft.duration_slots = n_slots
+        draft.duration_mins  = total_mins
+        draft.time_range     = time_range
+        draft.overflow_mins  = overflow
 
         svc_text = ", ".join(_svc_client_label(s, lang) for s in selected)
 
-        confirm_msg = tx(uid, "confirm_text",
-                         date=_fmt_date(d, lang), time=time_range,
-                         dur=total_mins, name=name, phone=phone, svcs=svc_text)
+        confirm_msg = _tx(lang, "confirm_text",
+                          date=_fmt_date(d, lang), time=time_range,
+                          dur=total_mins, name=name, phone=phone, svcs=svc_text)
         if overflow > 0:
             if lang == "uz":
                 confirm_msg += (
@@ -1462,8 +2073,8 @@ async def cb_service_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE)
                     f"Если мастер примет заявку — можете приходить!"
                 )
 
-        await query.edit_message_text(
-            confirm_msg,
+        await _safe_edit(
+            query, confirm_msg,
             parse_mode="HTML",
             reply_markup=_confirm_keyboard(lang),
         )
@@ -1481,10 +2092,24 @@ def _finalize_confirmed(app, booking: dict) -> None:
     Only the barber reminder is scheduled — the "client" chat is the barber's
     own, so a separate client reminder would just duplicate it.
     """
-    appointments[booking["slot_key"]] = booking
-    _db_save_booking(booking["slot_key"], booking)
+    _store_appointment(booking["slot_key"], booking)
+    with _db_batch():
+        _db_save_booking(booking["slot_key"], booking)
+        _db_log_event("approved", booking["slot_key"], booking.get("user_id"))
     _schedule_barber_reminder(app, booking)
-    _db_log_event("approved", booking["slot_key"], booking.get("user_id"))
+
+
+# Barber-facing approval request (Russian only, like the rest of the barber UI)
+_NEW_REQUEST_TMPL = (
+    "🔔 <b>Новая заявка!</b>\n\n"
+    "📅 {date_str}\n"
+    "🕐 {time_range}\n"
+    "👤 {name}\n"
+    "📞 {phone}\n"
+    "✂️ {svc_ru}\n"
+    "⏱ ~{total_mins} мин.{price_part}"
+    "{overflow_warning}"
+)
 
 
 async def cb_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -1498,24 +2123,25 @@ async def cb_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if query.data != "confirm_yes":
         return STATE_CONFIRM
 
-    d          = context.user_data["date"]
-    t          = context.user_data["time"]
+    draft      = _draft(context)
+    d          = draft.date
+    t          = draft.time
     slot_key   = f"{d.isoformat()} {t}"
-    name       = context.user_data["name"]
-    phone      = context.user_data["phone"]
-    services   = list(context.user_data["services"])
-    n_slots    = context.user_data.get("duration_slots", 1)
-    total_mins = context.user_data.get("duration_mins",  30)
-    time_range = context.user_data.get("time_range", t)
+    name       = draft.name
+    phone      = draft.phone
+    services   = list(draft.services)
+    n_slots    = draft.duration_slots
+    total_mins = draft.duration_mins
+    time_range = draft.time_range or t
     date_str   = _fmt_date(d, lang)
 
     if not _can_fit(d, t, n_slots, allow_overflow=True):
-        await query.edit_message_text(tx(uid, "slot_race"))
+        await _safe_edit(query, _tx(lang, "slot_race"))
         context.user_data.clear()
         return ConversationHandler.END
 
-    overflow = context.user_data.get("overflow_mins", 0)
-    is_barber_booking = context.user_data.get("barber_booking", False)
+    overflow = draft.overflow_mins
+    is_barber_booking = draft.barber_booking
     total_price = _calc_total_price(services)
 
     booking = {
@@ -1537,7 +2163,7 @@ async def cb_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     _db_log_event("created", slot_key, uid,
                   {"services": services, "duration_mins": total_mins})
 
-    svc_ru     = ", ".join(_svc_label(s, "ru") for s in services)
+    svc_ru     = ", ".join([_SVC_LABEL_RU[s] for s in services])
     price_ru   = _price_line(total_price, "ru")
     price_part = f"\n{price_ru}" if price_ru else ""
 
@@ -1549,10 +2175,10 @@ async def cb_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         overflow_part = (
             f"\n\n⚠️ Выходит за рабочие часы на {overflow} мин!" if overflow > 0 else ""
         )
-        await query.edit_message_text(
-            tx(uid, "client_booked", date=date_str, time=time_range, name=name,
-               phone=phone, svcs=svc_ru, mins=total_mins,
-               price=price_part, overflow=overflow_part),
+        await _safe_edit(
+            query, _tx(lang, "client_booked", date=date_str, time=time_range, name=name,
+                phone=phone, svcs=svc_ru, mins=total_mins,
+                price=price_part, overflow=overflow_part),
             parse_mode="HTML",
         )
         context.user_data.clear()
@@ -1560,40 +2186,24 @@ async def cb_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
     # ── Regular client → enter pending, notify barber for approval ───────────
     bid = _next_id()
-    pending_bookings[bid] = booking
+    _store_pending(bid, booking)
     logger.info("Pending #%d: %s → %s (%d slots)", bid, slot_key, name, n_slots)
-    customer_cache.setdefault(uid, {}).update(name=name, phone=phone)
-    _db_save_pending(bid, booking)
-    _db_save_customer(uid)
+    with _db_batch():
+        _db_save_pending(bid, booking)
+        _update_customer(uid, name=name, phone=phone)
     # _schedule_pending_timeout(context.application, bid, timedelta(minutes=30))
 
     overflow_warning = (
         f"\n\n⚠️ <b>Выходит за рабочие часы на {overflow} мин!</b>"
         if overflow > 0 else ""
     )
-    barber_msg = await _send_to_all_barbers(
-        query.get_bot(),
-        text=(
-            f"🔔 <b>Новая заявка!</b>\n\n"
-            f"📅 {date_str}\n"
-            f"🕐 {time_range}\n"
-            f"👤 {name}\n"
-            f"📞 {phone}\n"
-            f"✂️ {svc_ru}\n"
-            f"⏱ ~{total_mins} мин.{price_part}"
-            f"{overflow_warning}"
-        ),
-        parse_mode="HTML",
-        reply_markup=_approval_keyboard(bid),
-    )
-    if barber_msg:
-        # Store {chat_id: message_id} for all barbers so we can edit all later
-        pending_bookings[bid]["barber_msg_ids"] = {
-            str(cid): m.message_id for cid, m in barber_msg.items()
-        }
-        _db_save_pending(bid, pending_bookings[bid])
+    barber_text = _NEW_REQUEST_TMPL.format_map({
+        "date_str": date_str, "time_range": time_range, "name": name, "phone": phone,
+        "svc_ru": svc_ru, "total_mins": total_mins, "price_part": price_part,
+        "overflow_warning": overflow_warning,
+    })
 
-    waiting_msg = tx(uid, "waiting", date=date_str, time=time_range)
+    waiting_msg = _tx(lang, "waiting", date=date_str, time=time_range)
     if overflow > 0:
         if lang == "uz":
             waiting_msg += (
@@ -1605,23 +2215,50 @@ async def cb_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
                 f"\n\n⚠️ Запись выходит за рабочие часы на <b>{overflow} мин.</b> "
                 f"Если мастер подтвердит — сообщим!"
             )
-    await query.edit_message_text(
-        waiting_msg,
+    # Answer the customer first; barber notifications go out in the background.
+    await _safe_edit(
+        query, waiting_msg,
         parse_mode="HTML",
     )
     context.user_data.clear()
+    _notify_tasks[bid] = context.application.create_task(
+        _notify_barbers_new_request(query.get_bot(), bid, barber_text)
+    )
     return ConversationHandler.END
 
 
+# Approval requests still being sent, by pending id — _fan_out_decision waits
+# for them so a decision made mid-send still reaches every barber's message.
+_notify_tasks: dict[int, asyncio.Task] = {}
+
+
+async def _notify_barbers_new_request(bot, bid: int, text: str) -> None:
+    booking = pending_bookings.get(bid)
+    try:
+        barber_msg = await _send_to_all_barbers(
+            bot, text=text, parse_mode="HTML", reply_markup=_approval_keyboard(bid),
+        )
+        if not barber_msg or booking is None:
+            return
+        # Store {chat_id: message_id} for all barbers so we can edit all later —
+        # even if a barber already decided while the others were being sent to.
+        booking["barber_msg_ids"] = {
+            str(cid): m.message_id for cid, m in barber_msg.items()
+        }
+        if bid in pending_bookings:
+            _db_save_pending(bid, booking)
+        elif appointments.get(booking["slot_key"]) is booking:
+            _db_save_booking(booking["slot_key"], booking)
+    finally:
+        _notify_tasks.pop(bid, None)
+
+
 # ─────────────────────────── Barber: approve / reject ────────────────────────
 
+@_barber_only("Только мастер может одобрять записи.")
 async def cb_barber_decision(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
 
-    if not _is_barber(update.effective_user.id):
-        await query.answer("Только мастер может одобрять записи.", show_alert=True)
-        return
-
     action, bid_str = query.data.split("_", 1)
     bid = int(bid_str)
 
@@ -1632,21 +2269,21 @@ async def cb_barber_decision(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     await query.answer()
 
-    booking   = pending_bookings.pop(bid)
-    _db_delete_pending(bid)
+    booking   = _drop_pending(bid)
     _cancel_pending_timeout(context.application, bid)
     cust_lang = booking.get("user_lang", "ru")
 
-    barber_msg_ids = booking.get("barber_msg_ids", {})
     status_text = query.message.text
 
     if action == "approve":
-        appointments[booking["slot_key"]] = booking
-        _db_save_booking(booking["slot_key"], booking)
+        _store_appointment(booking["slot_key"], booking)
+        with _db_batch():
+            _db_delete_pending(bid)
+            _db_save_booking(booking["slot_key"], booking)
+            _db_log_event("approved", booking["slot_key"], booking.get("user_id"))
         _schedule_reminder(context.application, booking)
         _schedule_barber_reminder(context.application, booking)
         logger.info("Approved #%d %s", bid, booking["slot_key"])
-        _db_log_event("approved", booking["slot_key"], booking.get("user_id"))
         updated_text = status_text + "\n\n✅ <b>Одобрено</b>"
         cust_text = STRINGS[cust_lang]["approved"].format(
             date=booking["date_str"],
@@ -1655,21 +2292,36 @@ async def cb_barber_decision(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
     else:
         logger.info("Rejected #%d %s", bid, booking["slot_key"])
-        _db_log_event("rejected", booking["slot_key"], booking.get("user_id"))
+        with _db_batch():
+            _db_delete_pending(bid)
+            _db_log_event("rejected", booking["slot_key"], booking.get("user_id"))
         updated_text = status_text + "\n\n❌ <b>Отклонено</b>"
         cust_text = STRINGS[cust_lang]["rejected"].format(
             date=booking["date_str"], time=booking["time_range"]
         )
 
-    # Edit the message for the barber who clicked
-    await query.edit_message_text(updated_text, parse_mode="HTML")
+    # Edit the message for the barber who clicked; the rest happens in the background
+    await _safe_edit(query, updated_text, parse_mode="HTML")
+    context.application.create_task(_fan_out_decision(
+        query.get_bot(), bid, booking, str(update.effective_user.id),
+        updated_text, cust_text,
+    ))
+
+
+async def _fan_out_decision(bot, bid: int, booking: dict, actor_id: str,
+                            updated_text: str, cust_text: str) -> None:
+    """Mirror an approve/reject to the other barbers and notify the customer."""
+    # The request may still be going out to the other barbers — let it finish
+    # so the messages it sends are edited too.
+    notify = _notify_tasks.get(bid)
+    if notify is not None:
+        await asyncio.wait([notify])
     # Edit messages for all other barbers
-    actor_id = str(update.effective_user.id)
-    for cid_str, msg_id in barber_msg_ids.items():
+    for cid_str, msg_id in booking.get("barber_msg_ids", {}).items():
         if cid_str == actor_id:
             continue
         try:
-            await query.get_bot().edit_message_text(
+            await bot.edit_message_text(
                 chat_id=int(cid_str), message_id=msg_id,
                 text=updated_text, parse_mode="HTML",
             )
@@ -1677,9 +2329,9 @@ async def cb_barber_decision(update: Update, context: ContextTypes.DEFAULT_TYPE)
             logger.error("Edit barber msg %s/%d failed: %s", cid_str, msg_id, exc)
 
     try:
-        await query.get_bot().send_message(
+        await bot.send_message(
             chat_id=booking["chat_id"], text=cust_text,
-            parse_mode="HTML", reply_markup=_main_menu_kb(cust_lang),
+            parse_mode="HTML", reply_markup=_main_menu_kb(booking.get("user_lang", "ru")),
         )
     except Exception as exc:
         logger.error("Customer notify failed: %s", exc)
@@ -1687,17 +2339,15 @@ async def cb_barber_decision(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 # ─────────────────────────── Barber: cancel confirmed booking ─────────────────
 # Step 1 — confirmation prompt  callback_data: "bconfirm_2026-02-24_10:00"
+@_barber_only()
 async def cb_barber_confirm_cancel(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     query = update.callback_query
     await query.answer()
 
-    if not _is_barber(update.effective_user.id):
-        return
-
     encoded  = query.data[len("bconfirm_"):]
-    slot_key = encoded.replace("_", " ", 1)
+    slot_key = _cb_slot(encoded)
 
     bk = appointments.get(slot_key)
     if not bk:
@@ -1707,49 +2357,47 @@ async def cb_barber_confirm_cancel(
     text = (
         f"⚠️ <b>Подтвердите отмену</b>\n\n"
         f"👤 {bk['name']}  <i>({bk.get('phone', '')})</i>\n"
-        f"📅 {bk.get('date_str', slot_key.split()[0])}\n"
-        f"🕐 {bk.get('time_range', slot_key.split()[1])}\n\n"
+        f"📅 {bk.get('date_str', slot_key[:10])}\n"
+        f"🕐 {bk.get('time_range', slot_key[11:])}\n\n"
         f"Отменить эту запись?"
     )
     kb = InlineKeyboardMarkup([
         [InlineKeyboardButton("✅ Да, отменить", callback_data=f"bcancel_{encoded}")],
         [InlineKeyboardButton("← Назад",        callback_data=f"bselect_{encoded}")],
     ])
-    await query.edit_message_text(text, parse_mode="HTML", reply_markup=kb)
+    await _safe_edit(query, text, parse_mode="HTML", reply_markup=kb)
 
 
 # Step 2 — actual cancel  callback_data: "bcancel_2026-02-24_10:00"
+@_barber_only("Только мастер может отменять записи.")
 async def cb_barber_cancel_booking(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     query = update.callback_query
     await query.answer()
 
-    if not _is_barber(update.effective_user.id):
-        await query.answer("Только мастер может отменять записи.", show_alert=True)
-        return
-
     encoded  = query.data[len("bcancel_"):]       # "2026-02-24_10:00"
-    slot_key = encoded.replace("_", " ", 1)        # "2026-02-24 10:00"
+    slot_key = _cb_slot(encoded)        # "2026-02-24 10:00"
 
     if slot_key not in appointments:
         await query.answer("Запись не найдена.", show_alert=True)
         return
 
-    booking   = appointments.pop(slot_key)
-    _db_delete_booking(slot_key)
+    booking   = _drop_appointment(slot_key)
+    with _db_batch():
+        _db_delete_booking(slot_key)
+        _db_log_event("cancelled_barber", slot_key, booking.get("user_id"))
     _cancel_reminder(context.application, slot_key)
     _cancel_barber_reminder(context.application, slot_key)
     cust_lang = booking.get("user_lang", "ru")
     logger.info("Barber cancelled: %s (%s)", slot_key, booking["name"])
-    _db_log_event("cancelled_barber", slot_key, booking.get("user_id"))
 
     try:
         await query.get_bot().send_message(
             chat_id=booking["chat_id"],
             text=STRINGS[cust_lang]["cancelled_barber"].format(
-                date=booking.get("date_str", slot_key.split(" ")[0]),
-                time=booking.get("time_range", slot_key.split(" ")[1]),
+                date=booking.get("date_str", slot_key[:10]),
+                time=booking.get("time_range", slot_key[11:]),
             ),
             parse_mode="HTML",
         )
@@ -1758,8 +2406,8 @@ async def cb_barber_cancel_booking(
 
     manage_text, manage_kb = _build_manage_list()
     try:
-        await query.edit_message_text(
-            f"✅ Запись <b>{booking['name']}</b> отменена.\n\n" + manage_text,
+        await _safe_edit(
+            query, f"✅ Запись <b>{booking['name']}</b> отменена.\n\n" + manage_text,
             parse_mode="HTML",
             reply_markup=manage_kb,
         )
@@ -1769,26 +2417,39 @@ async def cb_barber_cancel_booking(
 
 # ─────────────────────────── Booking management (barber) ─────────────────────
 
+def _keys_from(keys: SortedList, since: datetime) -> list[str]:
+    """Slot keys in *keys* whose start is at or after *since*."""
+    cutoff = since.strftime("%Y-%m-%d %H:%M")
+    if since.second or since.microsecond:     # HH:MM itself is already past
+        return list(keys.irange(cutoff, inclusive=(False, True)))
+    return list(keys.irange(cutoff))
+
+
 def _all_upcoming_bookings() -> list[tuple[str, dict]]:
     """All confirmed bookings from now on, sorted chronologically."""
-    now = datetime.now(tz=TZ)
-    result = []
-    for slot_key, bk in appointments.items():
-        d_str, t_str = slot_key.split(" ")
-        appt_dt = datetime(*map(int, d_str.split("-")), int(t_str[:2]), int(t_str[3:5]), 0, tzinfo=TZ)
-        if appt_dt >= now - timedelta(hours=1):
-            result.append((slot_key, bk))
-    return sorted(result, key=lambda x: x[0])
+    since = datetime.now(tz=TZ) - timedelta(hours=1)
+    return [(k, appointments[k]) for k in _keys_from(_appt_keys, since)]
+
+
+# Last rendered manage list.  Between mutations (_taken_version) both lists are
+# suffixes of the sorted key indexes, so their lengths identify them.
+_manage_cache: tuple[tuple[int, int, int], tuple[str, InlineKeyboardMarkup]] | None = None
 
 
 def _build_manage_list() -> tuple[str, InlineKeyboardMarkup]:
+    global _manage_cache
     bookings = _all_upcoming_bookings()
-    now = datetime.now(tz=TZ)
-    upcoming_blocked = sorted(
-        s for s in blocked_slots
-        if datetime(*map(int, s.replace(" ", "-").replace(":", "-").split("-")), tzinfo=TZ) >= now
-    )
+    upcoming_blocked = _keys_from(_blocked_keys, datetime.now(tz=TZ))
+    key = (_taken_version, len(bookings), len(upcoming_blocked))
+    if _manage_cache is not None and _manage_cache[0] == key:
+        return _manage_cache[1]
+    result = _render_manage_list(bookings, upcoming_blocked)
+    _manage_cache = (key, result)
+    return result
 
+
+def _render_manage_list(bookings: list[tuple[str, dict]],
+                        upcoming_blocked: list[str]) -> tuple[str, InlineKeyboardMarkup]:
     if not bookings and not upcoming_blocked:
         return (
             "📋 <b>Нет предстоящих записей.</b>",
@@ -1801,18 +2462,18 @@ def _build_manage_list() -> tuple[str, InlineKeyboardMarkup]:
     lines = ["📋 <b>Предстоящие записи — выберите:</b>\n"]
     buttons = []
     for slot_key, bk in bookings:
-        d = date.fromisoformat(slot_key.split(" ")[0])
-        tr = bk.get("time_range", slot_key.split(" ")[1])
+        d = _parse_slot(slot_key).date()
+        tr = bk.get("time_range", slot_key[11:])
         label = f"{_fmt_date_short(d)} {tr} — {bk['name']}"
-        enc = slot_key.replace(" ", "_", 1)
+        enc = _slot_cb(slot_key)
         buttons.append([InlineKeyboardButton(label, callback_data=f"bselect_{enc}")])
 
     if upcoming_blocked:
         lines.append("\n🚫 <b>Заблокированные слоты:</b>")
         for slot_key in upcoming_blocked:
-            d = date.fromisoformat(slot_key.split(" ")[0])
-            t = slot_key.split(" ")[1]
-            enc = slot_key.replace(" ", "_", 1)
+            d = _parse_slot(slot_key).date()
+            t = slot_key[11:]
+            enc = _slot_cb(slot_key)
             label = f"🔓 {_fmt_date_short(d)} {t}"
             buttons.append([InlineKeyboardButton(label, callback_data=f"bblkunblock_{enc}")])
 
@@ -1821,37 +2482,33 @@ def _build_manage_list() -> tuple[str, InlineKeyboardMarkup]:
     return "\n".join(lines), InlineKeyboardMarkup(buttons)
 
 
+@_barber_only()
 async def cb_bmanage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    if not _is_barber(update.effective_user.id):
-        await query.answer()
-        return
     await query.answer()
     text, kb = _build_manage_list()
-    await query.edit_message_text(text, parse_mode="HTML", reply_markup=kb)
+    await _safe_edit(query, text, parse_mode="HTML", reply_markup=kb)
 
 
+@_barber_only()
 async def cb_bselect(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    if not _is_barber(update.effective_user.id):
-        await query.answer()
-        return
     await query.answer()
 
     encoded  = query.data[len("bselect_"):]
-    slot_key = encoded.replace("_", " ", 1)
+    slot_key = _cb_slot(encoded)
 
     if slot_key not in appointments:
         await query.answer("Запись не найдена.", show_alert=True)
         return
 
     bk       = appointments[slot_key]
-    svc_text = ", ".join(_svc_label(s, "ru") for s in bk["services"])
+    svc_text = ", ".join([_SVC_LABEL_RU[s] for s in bk["services"]])
     text = (
         f"📋 <b>Детали записи:</b>\n\n"
         f"👤 <b>{bk['name']}</b>  <i>({bk['phone']})</i>\n"
-        f"📅 {bk.get('date_str', slot_key.split()[0])}\n"
-        f"🕐 {bk.get('time_range', slot_key.split()[1])}\n"
+        f"📅 {bk.get('date_str', slot_key[:10])}\n"
+        f"🕐 {bk.get('time_range', slot_key[11:])}\n"
         f"✂️ {svc_text}\n"
         f"⏱ ~{bk.get('duration_mins', 30)} мин."
     )
@@ -1859,7 +2516,7 @@ async def cb_bselect(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         [InlineKeyboardButton("❌ Отменить запись", callback_data=f"bconfirm_{encoded}")],
         [InlineKeyboardButton("← Назад",           callback_data="bmanage")],
     ])
-    await query.edit_message_text(text, parse_mode="HTML", reply_markup=kb)
+    await _safe_edit(query, text, parse_mode="HTML", reply_markup=kb)
 
 
 async def cb_bclose(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -1870,44 +2527,46 @@ async def cb_bclose(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 # ─────────────────────────── Schedule builder ────────────────────────────────
 
+def _day_bookings(iso: str) -> list[tuple[str, str, dict]]:
+    """(time, status, booking) for one day in time order; confirmed first on ties."""
+    confirmed = [
+        (k[11:], "confirmed", appointments[k])
+        for k in _appt_keys.irange(f"{iso} 00:00", f"{iso} 23:59")
+    ]
+    bids = _pending_by_day.get(iso)
+    if not bids:            # common case: nothing awaiting approval that day
+        return confirmed
+    pending = sorted(
+        ((pending_bookings[bid]["slot_key"][11:], "pending", pending_bookings[bid])
+         for bid in bids),
+        key=lambda e: e[0],
+    )
+    if not confirmed:
+        return pending
+    return list(heapq.merge(confirmed, pending, key=lambda e: e[0]))
+
+
 def _build_day_schedule(d: date) -> tuple[str, InlineKeyboardMarkup]:
     today    = datetime.now(tz=TZ).date()
     max_date = today + timedelta(days=DAYS_AHEAD)
-    iso      = d.isoformat()
-
-    confirmed = {k: v for k, v in appointments.items()     if k.startswith(iso)}
-    pending   = {i: b for i, b in pending_bookings.items() if b["slot_key"].startswith(iso)}
+    entries  = _day_bookings(d.isoformat())
 
     if d == today:
         header = f"📅 <b>Сегодня — {_fmt_date(d)}</b>"
     else:
         header = f"📅 <b>{_fmt_date(d)}</b>"
 
-    if not confirmed and not pending:
+    if not entries:
         lines = [header, "\nЗаписей нет."]
     else:
         lines = [header + "\n"]
-        entries = []
-
-        for sk, bk in confirmed.items():
-            t  = sk.split(" ")[1]
-            tr = bk.get("time_range", t)
-            entries.append((t, "confirmed", sk, bk["name"], bk["phone"],
-                            [_svc_label(s, "ru") for s in bk["services"]], tr))
-
-        for _, bk in pending.items():
-            t  = bk["slot_key"].split(" ")[1]
-            tr = bk.get("time_range", t)
-            entries.append((t, "pending", None, bk["name"], bk["phone"],
-                            [_svc_label(s, "ru") for s in bk["services"]], tr))
-
-        entries.sort(key=lambda x: x[0])
-
-        for t, status, sk, name, phone, svc, tr in entries:
+        for t, status, bk in entries:
             icon = "✅" if status == "confirmed" else "⏳"
+            tr   = bk.get("time_range", t)
+            svc  = ", ".join([_SVC_LABEL_RU[s] for s in bk["services"]])
             lines.append(
-                f"{icon} <code>{tr}</code>  <b>{name}</b>  <i>({phone})</i>\n"
-                f"    {', '.join(svc)}"
+                f"{icon} <code>{tr}</code>  <b>{bk['name']}</b>  <i>({bk['phone']})</i>\n"
+                f"    {svc}"
             )
         lines.append("\n<i>✅ подтверждено  |  ⏳ ожидает одобрения</i>")
 
@@ -1933,14 +2592,13 @@ def _build_day_schedule(d: date) -> tuple[str, InlineKeyboardMarkup]:
 
 # ─────────────────────────── /bookings ───────────────────────────────────────
 
+@_barber_only()
 async def cb_bday_nav(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
-    if not _is_barber(update.effective_user.id):
-        return
     d = date.fromisoformat(query.data[len("bday_"):])
     text, kb = _build_day_schedule(d)
-    await query.edit_message_text(text, parse_mode="HTML", reply_markup=kb)
+    await _safe_edit(query, text, parse_mode="HTML", reply_markup=kb)
 
 
 async def cmd_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -1961,36 +2619,19 @@ async def cmd_week(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     lines = ["📅 <b>Расписание на неделю</b>\n"]
 
     for d in _working_dates():
-        iso       = d.isoformat()
-        day_label = _fmt_date(d)
-        confirmed = {k: v for k, v in appointments.items()     if k.startswith(iso)}
-        pending   = {i: b for i, b in pending_bookings.items() if b["slot_key"].startswith(iso)}
-
-        lines.append(f"<b>{day_label}</b>")
+        entries = _day_bookings(d.isoformat())
+        lines.append(f"<b>{_fmt_date(d)}</b>")
 
-        if not confirmed and not pending:
+        if not entries:
             lines.append("  — свободно\n")
             continue
 
-        entries = []
-        for sk, bk in confirmed.items():
-            t  = sk.split(" ")[1]
-            tr = bk.get("time_range", t)
-            entries.append((t, "confirmed", bk["name"], bk["phone"],
-                            [_svc_label(s, "ru") for s in bk["services"]], tr))
-        for _, bk in pending.items():
-            t  = bk["slot_key"].split(" ")[1]
-            tr = bk.get("time_range", t)
-            entries.append((t, "pending", bk["name"], bk["phone"],
-                            [_svc_label(s, "ru") for s in bk["services"]], tr))
-
-        entries.sort(key=lambda x: x[0])
-
-        for t, status, name, phone, svc, tr in entries:
+        for t, status, bk in entries:
             icon = "✅" if status == "confirmed" else "⏳"
+            svc  = ", ".join([_SVC_LABEL_RU[s] for s in bk["services"]])
             lines.append(
-                f"  {icon} <code>{tr}</code>  {name}  <i>({phone})</i>\n"
-                f"       {', '.join(svc)}"
+                f"  {icon} <code>{bk.get('time_range', t)}</code>  {bk['name']}  "
+                f"<i>({bk['phone']})</i>\n       {svc}"
             )
         lines.append("")
 
@@ -2002,7 +2643,7 @@ async def cmd_week(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 def _config_main_text() -> str:
     cfg  = schedule_config
-    days = " ".join(_DAY_SHORT[d] for d in sorted(cfg["work_days"])) or "—"
+    days = _work_days_label
     miniapp_line = (
         f"\n📱 Mini App:     <b>✅ активен</b>  <code>{MINIAPP_URL}</code>"
         if MINIAPP_ENABLED and MINIAPP_URL else
@@ -2017,6 +2658,7 @@ def _config_main_text() -> str:
     )
 
 
+@lru_cache(maxsize=None)
 def _config_main_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [
@@ -2028,23 +2670,35 @@ def _config_main_keyboard() -> InlineKeyboardMarkup:
 
 
 def _config_days_keyboard() -> InlineKeyboardMarkup:
-    work_days = schedule_config["work_days"]
-    row1, row2 = [], []
-    for d in range(4):   # Mon–Thu
-        tick = "✓" if d in work_days else "✗"
-        row1.append(InlineKeyboardButton(f"{tick} {_DAY_SHORT[d]}", callback_data=f"cfg_day_{d}"))
-    for d in range(4, 7):  # Fri–Sun
-        tick = "✓" if d in work_days else "✗"
-        row2.append(InlineKeyboardButton(f"{tick} {_DAY_SHORT[d]}", callback_data=f"cfg_day_{d}"))
+    return _build_config_days_keyboard(WORK_DAYS)
+
+
+@lru_cache(maxsize=32)
+def _build_config_days_keyboard(work_days: frozenset[int]) -> InlineKeyboardMarkup:
+    buttons = [_DAY_BUTTONS[d][d in work_days] for d in range(7)]
     return InlineKeyboardMarkup([
-        row1, row2,
+        buttons[:4],     # Mon–Thu
+        buttons[4:],     # Fri–Sun
         [InlineKeyboardButton("← Назад", callback_data="cfg_main")],
     ])
 
 
+# (off, on) toggle button per weekday, indexed by `d in work_days`.
+_DAY_BUTTONS: tuple[tuple[InlineKeyboardButton, InlineKeyboardButton], ...] = tuple(
+    (
+        InlineKeyboardButton(f"✗ {_DAY_SHORT[d]}", callback_data=f"cfg_day_{d}"),
+        InlineKeyboardButton(f"✓ {_DAY_SHORT[d]}", callback_data=f"cfg_day_{d}"),
+    )
+    for d in range(7)
+)
+
+
 def _config_hours_keyboard() -> InlineKeyboardMarkup:
-    s = schedule_config["start_hour"]
-    e = schedule_config["end_hour"]
+    return _build_config_hours_keyboard(START_HOUR, END_HOUR)
+
+
+@lru_cache(maxsize=32)
+def _build_config_hours_keyboard(s: int, e: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [
             InlineKeyboardButton("▼", callback_data="cfg_start_dec"),
@@ -2069,43 +2723,80 @@ async def cmd_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     )
 
 
+# Holding ▲/▼ or toggling several days sends a burst of cfg_ callbacks.  The
+# config itself is updated (and queued for saving) on every tap, but the menu
+# is re-rendered only once the taps pause for _CFG_DEBOUNCE seconds.
+_CFG_DEBOUNCE = 0.3
+_cfg_edits: dict[int, asyncio.Task] = {}
+
+
+def _cancel_cfg_edit(uid: int) -> None:
+    pending = _cfg_edits.pop(uid, None)
+    if pending is not None:
+        pending.cancel()
+
+
+def _debounced_cfg_edit(context: ContextTypes.DEFAULT_TYPE, uid: int, query,
+                        keyboard: Callable[[], InlineKeyboardMarkup]) -> None:
+    _cancel_cfg_edit(uid)
+    _cfg_edits[uid] = context.application.create_task(
+        _cfg_edit_later(uid, query, keyboard)
+    )
+
+
+async def _cfg_edit_later(uid: int, query,
+                          keyboard: Callable[[], InlineKeyboardMarkup]) -> None:
+    await asyncio.sleep(_CFG_DEBOUNCE)
+    _cfg_edits.pop(uid, None)       # from here on a new tap schedules its own edit
+    try:
+        # The days/hours prompt text never changes — only the buttons do.
+        await query.edit_message_reply_markup(reply_markup=keyboard())
+    except Exception as exc:
+        # e.g. ▲ then ▼ within the window — the menu ends up unchanged
+        if "not modified" not in str(exc).lower():
+            logger.warning("config edit failed: %s", exc)
+
+
+@_barber_only()
 async def cb_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
 
-    if not _is_barber(update.effective_user.id):
-        return
-
     data = query.data   # cfg_main | cfg_days | cfg_hours | cfg_day_N |
                         # cfg_start_inc/dec | cfg_end_inc/dec | cfg_done | cfg_noop
 
     if data == "cfg_noop":
         return
 
+    if data in ("cfg_done", "cfg_main", "cfg_days", "cfg_hours"):
+        # Switching screens drops a pending days/hours redraw, which would
+        # otherwise put those buttons back under the new message.
+        _cancel_cfg_edit(update.effective_user.id)
+
     if data == "cfg_done":
-        await query.edit_message_text(
-            _config_main_text() + "\n\n✅ <b>Сохранено.</b>",
+        await _safe_edit(
+            query, _config_main_text() + "\n\n✅ <b>Сохранено.</b>",
             parse_mode="HTML",
         )
         return
 
     if data == "cfg_main":
-        await query.edit_message_text(
-            _config_main_text(), parse_mode="HTML", reply_markup=_config_main_keyboard()
+        await _safe_edit(
+            query, _config_main_text(), parse_mode="HTML", reply_markup=_config_main_keyboard()
         )
         return
 
     if data == "cfg_days":
-        await query.edit_message_text(
-            "📅 <b>Рабочие дни</b>\n\nНажмите для переключения:",
+        await _safe_edit(
+            query, "📅 <b>Рабочие дни</b>\n\nНажмите для переключения:",
             parse_mode="HTML",
             reply_markup=_config_days_keyboard(),
         )
         return
 
     if data == "cfg_hours":
-        await query.edit_message_text(
-            "🕐 <b>Рабочие часы</b>\n\nНастройте начало и конец рабочего дня:",
+        await _safe_edit(
+            query, "🕐 <b>Рабочие часы</b>\n\nНастройте начало и конец рабочего дня:",
             parse_mode="HTML",
             reply_markup=_config_hours_keyboard(),
         )
@@ -2120,11 +2811,7 @@ async def cb_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         else:
             work_days.add(d)
         _save_config()
-        await query.edit_message_text(
-            "📅 <b>Рабочие дни</b>\n\nНажмите для переключения:",
-            parse_mode="HTML",
-            reply_markup=_config_days_keyboard(),
-        )
+        _debounced_cfg_edit(context, update.effective_user.id, query, _config_days_keyboard)
         return
 
     if data in ("cfg_start_inc", "cfg_start_dec", "cfg_end_inc", "cfg_end_dec"):
@@ -2139,11 +2826,7 @@ async def cb_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         elif data == "cfg_end_dec" and e - 1 > s:
             schedule_config["end_hour"] = e - 1
         _save_config()
-        await query.edit_message_text(
-            "🕐 <b>Рабочие часы</b>\n\nНастройте начало и конец рабочего дня:",
-            parse_mode="HTML",
-            reply_markup=_config_hours_keyboard(),
-        )
+        _debounced_cfg_edit(context, update.effective_user.id, query, _config_hours_keyboard)
         return
 
 
@@ -2221,17 +2904,20 @@ def _stats_keyboard(active: str) -> InlineKeyboardMarkup:
 
 
 def _build_stats_text(start_d: date, end_d: date, period_label: str) -> str:
+    """Blocking (flushes and reads the DB) — call via asyncio.to_thread."""
     today = datetime.now(tz=TZ).date()
 
     all_bookings: list[dict[str, Any]] = []
     log_events: list[tuple[str, str, str | None, int | None]] = []
-    with sqlite3.connect(_DB_FILE) as conn:
-        for row in conn.execute("SELECT slot_key, data FROM bookings"):
-            bk = json.loads(row[1])
+    _db_flush()
+    with _DB_LOCK:
+        conn = _CONN
+        for row in conn.execute("SELECT slot_key, data FROM bookings").fetchall():
+            bk = orjson.loads(row[1])
             bk["_slot_key"] = row[0]
             all_bookings.append(bk)
         total_customers = conn.execute("SELECT COUNT(*) FROM customers").fetchone()[0]
-        for row in conn.execute("SELECT ts, event, slot_key, user_id FROM booking_log"):
+        for row in conn.execute("SELECT ts, event, slot_key, user_id FROM booking_log").fetchall():
             log_events.append((row[0], row[1], row[2], row[3]))
 
     evt_counter: Counter = Counter()
@@ -2392,16 +3078,14 @@ async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     context.user_data.pop("stats_awaiting_range", None)
     today = datetime.now(tz=TZ).date()
     start_d, end_d, label = _stats_period_range("all", today)
-    text = _build_stats_text(start_d, end_d, label)
+    text = await asyncio.to_thread(_build_stats_text, start_d, end_d, label)
     await update.message.reply_text(text, parse_mode="HTML",
                                     reply_markup=_stats_keyboard("all"))
 
 
+@_barber_only("Только для мастера.")
 async def cb_stats_period(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    if not _is_barber(update.effective_user.id):
-        await query.answer("Только для мастера.", show_alert=True)
-        return
     await query.answer()
     code = query.data[len("stats_p_"):]
     if code == "custom":
@@ -2414,10 +3098,10 @@ async def cb_stats_period(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
     today = datetime.now(tz=TZ).date()
     start_d, end_d, label = _stats_period_range(code, today)
-    text = _build_stats_text(start_d, end_d, label)
+    text = await asyncio.to_thread(_build_stats_text, start_d, end_d, label)
     try:
-        await query.edit_message_text(text, parse_mode="HTML",
-                                      reply_markup=_stats_keyboard(code))
+        await _safe_edit(query, text, parse_mode="HTML",
+                         reply_markup=_stats_keyboard(code))
     except Exception as exc:
         # "message is not modified" when same period clicked twice — ignore
         if "not modified" not in str(exc).lower():
@@ -2454,7 +3138,7 @@ async def on_stats_custom_text(update: Update, context: ContextTypes.DEFAULT_TYP
         start_d, end_d = end_d, start_d
     context.user_data.pop("stats_awaiting_range", None)
     label = f"{start_d.strftime('%d.%m.%Y')} — {end_d.strftime('%d.%m.%Y')}"
-    text = _build_stats_text(start_d, end_d, label)
+    text = await asyncio.to_thread(_build_stats_text, start_d, end_d, label)
     await update.message.reply_text(text, parse_mode="HTML",
                                     reply_markup=_stats_keyboard("custom"))
 
@@ -2462,10 +3146,11 @@ async def on_stats_custom_text(update: Update, context: ContextTypes.DEFAULT_TYP
 # ─────────────────────────── /broadcast — barber announcement ────────────────
 
 def _broadcast_recipients() -> list[int]:
-    """All customer user_ids except barber accounts."""
+    """All customer user_ids except barber accounts.  Blocking — call via asyncio.to_thread."""
     ids: list[int] = []
-    with sqlite3.connect(_DB_FILE) as conn:
-        for (uid,) in conn.execute("SELECT user_id FROM customers"):
+    _db_flush()
+    with _DB_LOCK:
+        for (uid,) in _CONN.execute("SELECT user_id FROM customers").fetchall():
             if uid is not None and uid not in BARBER_CHAT_IDS:
                 ids.append(uid)
     return ids
@@ -2490,7 +3175,7 @@ async def cmd_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         )
         return
 
-    recipients = _broadcast_recipients()
+    recipients = await asyncio.to_thread(_broadcast_recipients)
     context.user_data["broadcast_text"] = msg
     preview = (
         f"📢 <b>Предпросмотр рассылки</b>\n"
@@ -2505,25 +3190,23 @@ async def cmd_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     await update.message.reply_text(preview, reply_markup=kb)
 
 
+@_barber_only("Только для мастера.")
 async def cb_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    if not _is_barber(update.effective_user.id):
-        await query.answer("Только для мастера.", show_alert=True)
-        return
     await query.answer()
 
     if query.data == "bcast_cancel":
         context.user_data.pop("broadcast_text", None)
-        await query.edit_message_text("❌ Рассылка отменена.")
+        await _safe_edit(query, "❌ Рассылка отменена.")
         return
 
     msg = context.user_data.pop("broadcast_text", None)
     if not msg:
-        await query.edit_message_text("⚠️ Текст рассылки потерян, начните заново: /broadcast")
+        await _safe_edit(query, "⚠️ Текст рассылки потерян, начните заново: /broadcast")
         return
 
-    recipients = _broadcast_recipients()
-    await query.edit_message_text(f"📤 Отправляю… (0/{len(recipients)})")
+    recipients = await asyncio.to_thread(_broadcast_recipients)
+    await _safe_edit(query, f"📤 Отправляю… (0/{len(recipients)})")
 
     sent = failed = 0
     for i, uid in enumerate(recipients, 1):
@@ -2537,26 +3220,51 @@ async def cb_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await asyncio.sleep(0.05)
         if i % 25 == 0:
             try:
-                await query.edit_message_text(f"📤 Отправляю… ({i}/{len(recipients)})")
+                await _safe_edit(query, f"📤 Отправляю… ({i}/{len(recipients)})")
             except Exception:
                 pass
 
-    await query.edit_message_text(
-        f"✅ <b>Рассылка завершена</b>\n\n"
+    await _safe_edit(
+        query, f"✅ <b>Рассылка завершена</b>\n\n"
         f"Доставлено: <b>{sent}</b>\n"
         f"Не доставлено: <b>{failed}</b> (заблокировали бота / удалили чат)",
         parse_mode="HTML",
     )
 
 
+# ─────────────────────────── Job handles ─────────────────────────────────────
+# Jobs we schedule, by name, so cancelling one is a dict pop rather than a
+# get_jobs_by_name() scan of the whole queue.  Job callbacks call _forget_job
+# first: a run_once job that already fired cannot be removed again.
+
+_jobs: dict[str, Job] = {}
+
+
+def _run_once(app, callback, *, when, data: dict, name: str) -> None:
+    _cancel_job(name)
+    _jobs[name] = app.job_queue.run_once(callback, when=when, data=data, name=name)
+
+
+def _cancel_job(name: str) -> None:
+    job = _jobs.pop(name, None)
+    if job is not None:
+        job.schedule_removal()
+
+
+def _forget_job(job: Job) -> None:
+    if _jobs.get(job.name) is job:
+        del _jobs[job.name]
+
+
 # ─────────────────────────── 30-min reminder job ─────────────────────────────
 
 async def _send_reminder(context: ContextTypes.DEFAULT_TYPE) -> None:
+    _forget_job(context.job)
     data = context.job.data
     try:
         await context.bot.send_message(
             chat_id=data["chat_id"],
-            text=STRINGS[data["lang"]]["reminder"].format(time=data["time_range"]),
+            text=_tx(data["lang"], "reminder", time=data["time_range"]),
             parse_mode="HTML",
         )
     except Exception as exc:
@@ -2565,14 +3273,11 @@ async def _send_reminder(context: ContextTypes.DEFAULT_TYPE) -> None:
 
 def _schedule_reminder(app, booking: dict) -> None:
     """Schedule a 30-min-before reminder for a confirmed booking."""
-    d_str, t_str = booking["slot_key"].split(" ")
-    appt_dt = datetime(
-        *map(int, d_str.split("-")), int(t_str[:2]), int(t_str[3:5]), 0, tzinfo=TZ
-    )
+    appt_dt   = _parse_slot(booking["slot_key"])
     remind_at = appt_dt - timedelta(minutes=30)
     if remind_at > datetime.now(tz=TZ):
-        app.job_queue.run_once(
-            _send_reminder,
+        _run_once(
+            app, _send_reminder,
             when=remind_at,
             data={
                 "chat_id":    booking["chat_id"],
@@ -2586,39 +3291,33 @@ def _schedule_reminder(app, booking: dict) -> None:
 
 def _cancel_reminder(app, slot_key: str) -> None:
     """Remove any pending reminder job for a slot."""
-    for job in app.job_queue.get_jobs_by_name(f"reminder_{slot_key}"):
-        job.schedule_removal()
+    _cancel_job(f"reminder_{slot_key}")
 
 
 # ─────────────────────────── Barber reminder job ─────────────────────────────
 
 async def _send_barber_reminder(context: ContextTypes.DEFAULT_TYPE) -> None:
-    data = context.job.data
-    svc_text = ", ".join(_svc_label(s, "ru") for s in data["services"])
-    await _send_to_all_barbers(
-        context.bot,
-        text=(
-            f"🔔 <b>Через 30 мин:</b> {data['name']}\n"
-            f"🕐 {data['time_range']}\n"
-            f"✂️ {svc_text}"
-        ),
-        parse_mode="HTML",
-    )
+    _forget_job(context.job)
+    await _send_to_all_barbers(context.bot, text=context.job.data["text"], parse_mode="HTML")
 
 
 def _schedule_barber_reminder(app, booking: dict) -> None:
     """Schedule a 30-min-before reminder to BARBER_CHAT_ID."""
-    d_str, t_str = booking["slot_key"].split(" ")
-    appt_dt   = datetime(*map(int, d_str.split("-")), int(t_str[:2]), int(t_str[3:5]), 0, tzinfo=TZ)
+    appt_dt   = _parse_slot(booking["slot_key"])
     remind_at = appt_dt - timedelta(minutes=30)
     if remind_at > datetime.now(tz=TZ):
-        app.job_queue.run_once(
-            _send_barber_reminder,
+        # The message is fully rendered now so the job itself does no string work.
+        svc_text = ", ".join([_SVC_LABEL_RU[s] for s in booking.get("services", [])])
+        tr       = booking.get("time_range", booking["slot_key"][11:])
+        _run_once(
+            app, _send_barber_reminder,
             when=remind_at,
             data={
-                "name":       booking["name"],
-                "time_range": booking.get("time_range", booking["slot_key"].split()[1]),
-                "services":   booking.get("services", []),
+                "text": (
+                    f"🔔 <b>Через 30 мин:</b> {booking['name']}\n"
+                    f"🕐 {tr}\n"
+                    f"✂️ {svc_text}"
+                ),
             },
             name=f"barber_reminder_{booking['slot_key']}",
         )
@@ -2626,30 +3325,31 @@ def _schedule_barber_reminder(app, booking: dict) -> None:
 
 
 def _cancel_barber_reminder(app, slot_key: str) -> None:
-    for job in app.job_queue.get_jobs_by_name(f"barber_reminder_{slot_key}"):
-        job.schedule_removal()
+    _cancel_job(f"barber_reminder_{slot_key}")
 
 
 # ─────────────────────────── Pending timeout job ─────────────────────────────
 
 async def _pending_timeout_job(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Auto-reject a pending booking if the barber hasn't responded in 30 min."""
+    _forget_job(context.job)
     bid = context.job.data["bid"]
     if bid not in pending_bookings:
         return   # Already processed (approved / rejected / cancelled by user)
 
-    bk = pending_bookings.pop(bid)
-    _db_delete_pending(bid)
+    bk = _drop_pending(bid)
+    with _db_batch():
+        _db_delete_pending(bid)
+        _db_log_event("timeout", bk["slot_key"], bk.get("user_id"))
     cust_lang = bk.get("user_lang", "ru")
     logger.info("Pending #%d auto-timed-out: %s", bid, bk["slot_key"])
-    _db_log_event("timeout", bk["slot_key"], bk.get("user_id"))
 
     try:
         await context.bot.send_message(
             chat_id=bk["chat_id"],
             text=STRINGS[cust_lang]["pending_timeout"].format(
-                date=bk.get("date_str", bk["slot_key"].split()[0]),
-                time=bk.get("time_range", bk["slot_key"].split()[1]),
+                date=bk.get("date_str", bk["slot_key"][:10]),
+                time=bk.get("time_range", bk["slot_key"][11:]),
             ),
             parse_mode="HTML",
         )
@@ -2660,8 +3360,8 @@ async def _pending_timeout_job(context: ContextTypes.DEFAULT_TYPE) -> None:
     timeout_text  = (
         f"⌛ <b>Заявка истекла</b> (30 мин без ответа)\n\n"
         f"👤 {bk['name']}\n"
-        f"📅 {bk.get('date_str', bk['slot_key'].split()[0])}\n"
-        f"🕐 {bk.get('time_range', bk['slot_key'].split()[1])}"
+        f"📅 {bk.get('date_str', bk['slot_key'][:10])}\n"
+        f"🕐 {bk.get('time_range', bk['slot_key'][11:])}"
     )
     if barber_msg_ids:
         await _edit_all_barber_msgs(
@@ -2676,14 +3376,13 @@ async def _pending_timeout_job(context: ContextTypes.DEFAULT_TYPE) -> None:
 
 def _cancel_pending_timeout(app, bid: int) -> None:
     """Remove the timeout job for a pending booking (when barber or user acts first)."""
-    for job in app.job_queue.get_jobs_by_name(f"pending_timeout_{bid}"):
-        job.schedule_removal()
+    _cancel_job(f"pending_timeout_{bid}")
 
 
 def _schedule_pending_timeout(app, bid: int, when) -> None:
     """Schedule auto-rejection of pending booking at `when` (datetime or timedelta)."""
-    app.job_queue.run_once(
-        _pending_timeout_job,
+    _run_once(
+        app, _pending_timeout_job,
         when=when,
         data={"bid": bid},
         name=f"pending_timeout_{bid}",
@@ -2706,21 +3405,20 @@ def _collect_user_bookings(uid: int, today: date):
     upcoming: list[tuple[str, dict, str]] = []
     past: list[tuple[str, dict]] = []
 
-    for slot_key, bk in appointments.items():
-        if bk.get("user_id") != uid:
-            continue
+    for slot_key in _user_slots.get(uid, ()):
+        bk = appointments[slot_key]
         try:
-            sd = date.fromisoformat(slot_key.split()[0])
-        except (ValueError, IndexError):
+            sd = _parse_slot(slot_key).date()
+        except ValueError:
             continue
         if sd < today:
             past.append((slot_key, bk))
         else:
             upcoming.append((slot_key, bk, "confirmed"))
 
-    for bk in pending_bookings.values():
-        if bk.get("user_id") == uid:
-            upcoming.append((bk["slot_key"], bk, "pending"))
+    for bid in _user_bids.get(uid, ()):
+        bk = pending_bookings[bid]
+        upcoming.append((bk["slot_key"], bk, "pending"))
 
     upcoming.sort(key=lambda t: t[0])
     past.sort(key=lambda t: t[0], reverse=True)
@@ -2729,9 +3427,10 @@ def _collect_user_bookings(uid: int, today: date):
 
 def _short_date(slot_key: str) -> str:
     try:
-        return date.fromisoformat(slot_key.split()[0]).strftime("%d.%m")
-    except (ValueError, IndexError):
-        return slot_key.split()[0]
+        d = _parse_slot(slot_key)
+    except ValueError:
+        return slot_key[:10]
+    return f"{d.day:02d}.{d.month:02d}"
 
 
 async def cmd_mybooking(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -2757,8 +3456,8 @@ async def cmd_mybooking(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             status_label = tx(uid, "mybooking_confirmed" if status == "confirmed"
                               else "mybooking_pending")
             lines.append(
-                f"  {mark} {bk.get('date_str', slot_key.split()[0])}, "
-                f"{bk.get('time_range', slot_key.split()[1])}\n"
+                f"  {mark} {bk.get('date_str', slot_key[:10])}, "
+                f"{bk.get('time_range', slot_key[11:])}\n"
                 f"     ✂️ {svc_text}\n"
                 f"     {status_label}"
             )
@@ -2786,8 +3485,8 @@ async def cmd_mybooking(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     multi = len(upcoming) > 1
     rows: list[list[InlineKeyboardButton]] = []
     for slot_key, bk, status in upcoming:
-        enc = slot_key.replace(" ", "_", 1)
-        suffix = f" · {_short_date(slot_key)} {slot_key.split()[1]}" if multi else ""
+        enc = _slot_cb(slot_key)
+        suffix = f" · {_short_date(slot_key)} {slot_key[11:]}" if multi else ""
         if status == "confirmed":
             rows.append([
                 InlineKeyboardButton(tx(uid, "btn_reschedule") + suffix,
@@ -2813,44 +3512,47 @@ async def cb_user_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     uid      = update.effective_user.id
     lang     = _lang(uid)
     encoded  = query.data[len("ucancel_"):]
-    slot_key = encoded.replace("_", " ", 1)
+    slot_key = _cb_slot(encoded)
 
     # Try confirmed
     if slot_key in appointments and appointments[slot_key].get("user_id") == uid:
-        booking = appointments.pop(slot_key)
-        _db_delete_booking(slot_key)
+        booking = _drop_appointment(slot_key)
+        with _db_batch():
+            _db_delete_booking(slot_key)
+            _db_log_event("cancelled_user", slot_key, uid)
         _cancel_reminder(context.application, slot_key)
         _cancel_barber_reminder(context.application, slot_key)
-        _db_log_event("cancelled_user", slot_key, uid)
         await _send_to_all_barbers(
             query.get_bot(),
             text=STRINGS["ru"]["cancelled_by_user_barber"].format(
                 name=booking["name"],
-                date=booking.get("date_str", slot_key.split()[0]),
-                time=booking.get("time_range", slot_key.split()[1]),
+                date=booking.get("date_str", slot_key[:10]),
+                time=booking.get("time_range", slot_key[11:]),
             ),
             parse_mode="HTML",
         )
-        await query.edit_message_text(tx(uid, "cancelled_by_user"), parse_mode="HTML")
+        await _safe_edit(query, tx(uid, "cancelled_by_user"), parse_mode="HTML")
         return
 
     # Try pending
-    for bid, bk in list(pending_bookings.items()):
-        if bk["slot_key"] == slot_key and bk.get("user_id") == uid:
-            pending_bookings.pop(bid)
-            _db_delete_pending(bid)
+    for bid in list(_pending_by_slot.get(slot_key, ())):
+        bk = pending_bookings[bid]
+        if bk.get("user_id") == uid:
+            _drop_pending(bid)
+            with _db_batch():
+                _db_delete_pending(bid)
+                _db_log_event("cancelled_user", slot_key, uid)
             _cancel_pending_timeout(context.application, bid)
-            _db_log_event("cancelled_user", slot_key, uid)
             await _send_to_all_barbers(
                 query.get_bot(),
                 text=STRINGS["ru"]["cancelled_by_user_barber"].format(
                     name=bk["name"],
-                    date=bk.get("date_str", slot_key.split()[0]),
-                    time=bk.get("time_range", slot_key.split()[1]),
+                    date=bk.get("date_str", slot_key[:10]),
+                    time=bk.get("time_range", slot_key[11:]),
                 ),
                 parse_mode="HTML",
             )
-            await query.edit_message_text(tx(uid, "cancelled_by_user"), parse_mode="HTML")
+            await _safe_edit(query, tx(uid, "cancelled_by_user"), parse_mode="HTML")
             return
 
     await query.answer("Запись не найдена.", show_alert=True)
@@ -2859,11 +3561,23 @@ async def cb_user_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 # ─────────────────────────── Customer: reschedule ────────────────────────────
 # Flow: /mybooking → uresch_ → urdate_ → urtime_ → urconfirm / urback
 
+@lru_cache(maxsize=None)
+def _reschedule_confirm_keyboard(lang: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(_tx(lang, "btn_confirm_reschedule"), callback_data="urconfirm")],
+        [InlineKeyboardButton(_tx(lang, "btn_cancel"),             callback_data="urback")],
+    ])
+
+
 def _mybooking_keyboard(uid: int, slot_key: str) -> InlineKeyboardMarkup:
-    enc = slot_key.replace(" ", "_", 1)
+    return _build_mybooking_keyboard(_lang(uid), _slot_cb(slot_key))
+
+
+@lru_cache(maxsize=256)
+def _build_mybooking_keyboard(lang: str, enc: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton(tx(uid, "btn_reschedule"),     callback_data=f"uresch_{enc}")],
-        [InlineKeyboardButton(tx(uid, "btn_cancel_booking"), callback_data=f"ucancel_{enc}")],
+        [InlineKeyboardButton(_tx(lang, "btn_reschedule"),     callback_data=f"uresch_{enc}")],
+        [InlineKeyboardButton(_tx(lang, "btn_cancel_booking"), callback_data=f"ucancel_{enc}")],
     ])
 
 
@@ -2874,18 +3588,17 @@ async def cb_user_reschedule(update: Update, context: ContextTypes.DEFAULT_TYPE)
     uid      = update.effective_user.id
     lang     = _lang(uid)
     encoded  = query.data[len("uresch_"):]
-    slot_key = encoded.replace("_", " ", 1)
+    slot_key = _cb_slot(encoded)
 
     if slot_key not in appointments or appointments[slot_key].get("user_id") != uid:
         await query.answer("Запись не найдена.", show_alert=True)
         return
 
-    context.user_data["reschedule_old_slot"] = slot_key
-    context.user_data.pop("reschedule_new_date", None)
-    context.user_data.pop("reschedule_new_time", None)
+    # Reschedule flow state: (old_slot, new_date, new_time)
+    context.user_data["resched"] = (slot_key, None, None)
 
-    await query.edit_message_text(
-        tx(uid, "reschedule_choose_date"),
+    await _safe_edit(
+        query, tx(uid, "reschedule_choose_date"),
         parse_mode="HTML",
         reply_markup=_date_keyboard(lang, date_prefix="urdate", cancel_data="urback"),
     )
@@ -2894,14 +3607,13 @@ async def cb_user_reschedule(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def cb_ur_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """User picked new date — show time picker for that date."""
     query = update.callback_query
-    await query.answer()
     uid      = update.effective_user.id
     lang     = _lang(uid)
     iso      = query.data[len("urdate_"):]
     new_date = date.fromisoformat(iso)
-    old_slot = context.user_data.get("reschedule_old_slot")
+    old_slot = context.user_data.get("resched", (None,))[0]
 
-    context.user_data["reschedule_new_date"] = new_date
+    context.user_data["resched"] = (old_slot, new_date, None)
 
     kb = _time_keyboard(
         new_date, lang,
@@ -2911,15 +3623,13 @@ async def cb_ur_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         exclude_slot_key=old_slot,
     )
     if kb is None:
-        await query.edit_message_text(
-            tx(uid, "no_slots", date=_fmt_date(new_date, lang)),
-            parse_mode="HTML",
-            reply_markup=_date_keyboard(lang, date_prefix="urdate", cancel_data="urback"),
-        )
+        await query.answer(_plain(tx(uid, "no_slots", date=_fmt_date(new_date, lang))),
+                           show_alert=True)
         return
 
-    await query.edit_message_text(
-        tx(uid, "reschedule_choose_time"),
+    await query.answer()
+    await _safe_edit(
+        query, tx(uid, "reschedule_choose_time"),
         reply_markup=kb,
     )
 
@@ -2931,8 +3641,7 @@ async def cb_ur_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     uid      = update.effective_user.id
     lang     = _lang(uid)
     new_time = query.data[len("urtime_"):]
-    new_date = context.user_data.get("reschedule_new_date")
-    old_slot = context.user_data.get("reschedule_old_slot")
+    old_slot, new_date, _ = context.user_data.get("resched", (None, None, None))
 
     if not new_date or not old_slot:
         await query.answer("Сессия истекла. Попробуйте /mybooking.", show_alert=True)
@@ -2950,21 +3659,18 @@ async def cb_ur_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 
     n_slots       = old_bk.get("duration_slots", 1)
     new_time_range = _fmt_time_range(new_time, n_slots)
-    context.user_data["reschedule_new_time"] = new_time
+    context.user_data["resched"] = (old_slot, new_date, new_time)
 
-    old_date_str = old_bk.get("date_str", old_slot.split()[0])
-    old_time_str = old_bk.get("time_range", old_slot.split()[1])
+    old_date_str = old_bk.get("date_str", old_slot[:10])
+    old_time_str = old_bk.get("time_range", old_slot[11:])
     new_date_str = _fmt_date(new_date, lang)
 
-    await query.edit_message_text(
-        tx(uid, "reschedule_confirm",
+    await _safe_edit(
+        query, tx(uid, "reschedule_confirm",
            old_date=old_date_str, old_time=old_time_str,
            new_date=new_date_str, new_time=new_time_range),
         parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton(tx(uid, "btn_confirm_reschedule"), callback_data="urconfirm")],
-            [InlineKeyboardButton(tx(uid, "btn_cancel"),             callback_data="urback")],
-        ]),
+        reply_markup=_reschedule_confirm_keyboard(lang),
     )
 
 
@@ -2974,21 +3680,19 @@ async def cb_ur_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     await query.answer()
     uid      = update.effective_user.id
     lang     = _lang(uid)
-    old_slot = context.user_data.pop("reschedule_old_slot", None)
-    new_date = context.user_data.pop("reschedule_new_date", None)
-    new_time = context.user_data.pop("reschedule_new_time", None)
+    old_slot, new_date, new_time = context.user_data.pop("resched", (None, None, None))
 
     if not old_slot or not new_date or not new_time:
-        await query.edit_message_text("Сессия истекла. Попробуйте /mybooking.")
+        await _safe_edit(query, "Сессия истекла. Попробуйте /mybooking.")
         return
 
     if old_slot not in appointments or appointments[old_slot].get("user_id") != uid:
-        await query.edit_message_text("Запись не найдена.")
+        await _safe_edit(query, "Запись не найдена.")
         return
 
-    # Remove old confirmed booking
-    old_bk = appointments.pop(old_slot)
-    _db_delete_booking(old_slot)
+    # Remove old confirmed booking (the DB row is dropped together with the
+    # new pending row below, so the restore path needs no write)
+    old_bk = _drop_appointment(old_slot)
     _cancel_reminder(context.application, old_slot)
     _cancel_barber_reminder(context.application, old_slot)
 
@@ -2998,19 +3702,17 @@ async def cb_ur_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
     if not _can_fit(new_date, new_time, n_slots, allow_overflow=True):
         # New slot taken — restore old booking and tell user to pick again
-        appointments[old_slot] = old_bk
-        _db_save_booking(old_slot, old_bk)
+        _store_appointment(old_slot, old_bk)
         _schedule_reminder(context.application, old_bk)
         _schedule_barber_reminder(context.application, old_bk)
-        context.user_data["reschedule_old_slot"] = old_slot
-        context.user_data["reschedule_new_date"] = new_date
+        context.user_data["resched"] = (old_slot, new_date, None)
         kb = _time_keyboard(
             new_date, lang,
             time_prefix="urtime", back_data="urback_date", cancel_data="urback",
             exclude_slot_key=old_slot,
         )
-        await query.edit_message_text(
-            tx(uid, "slot_taken"),
+        await _safe_edit(
+            query, _tx(lang, "slot_taken"),
             reply_markup=kb or _date_keyboard(lang, date_prefix="urdate", cancel_data="urback"),
         )
         return
@@ -3031,16 +3733,18 @@ async def cb_ur_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         "rescheduled_from": old_slot,
         "user_lang":        lang,
     }
-    pending_bookings[bid] = new_bk
-    _db_save_pending(bid, new_bk)
+    _store_pending(bid, new_bk)
+    with _db_batch():
+        _db_delete_booking(old_slot)
+        _db_save_pending(bid, new_bk)
+        _db_log_event("rescheduled", old_slot, old_bk.get("user_id"), {"new_slot": new_slot})
     # _schedule_pending_timeout(context.application, bid, timedelta(minutes=30))
 
     logger.info("Reschedule #%d: %s → %s (%s)", bid, old_slot, new_slot, old_bk["name"])
-    _db_log_event("rescheduled", old_slot, old_bk.get("user_id"), {"new_slot": new_slot})
 
-    old_date_str = old_bk.get("date_str", old_slot.split()[0])
-    old_time_str = old_bk.get("time_range", old_slot.split()[1])
-    svc_ru       = ", ".join(_svc_label(s, "ru") for s in old_bk["services"])
+    old_date_str = old_bk.get("date_str", old_slot[:10])
+    old_time_str = old_bk.get("time_range", old_slot[11:])
+    svc_ru       = ", ".join([_SVC_LABEL_RU[s] for s in old_bk["services"]])
     overflow_warning = (
         f"\n\n⚠️ <b>Выходит за рабочие часы на {overflow} мин!</b>"
         if overflow > 0 else ""
@@ -3061,8 +3765,8 @@ async def cb_ur_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         reply_markup=_approval_keyboard(bid),
     )
 
-    await query.edit_message_text(
-        tx(uid, "reschedule_waiting", date=new_date_str, time=new_tr),
+    await _safe_edit(
+        query, _tx(lang, "reschedule_waiting", date=new_date_str, time=new_tr),
         parse_mode="HTML",
     )
 
@@ -3073,28 +3777,26 @@ async def cb_ur_back(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     await query.answer()
     uid      = update.effective_user.id
     lang     = _lang(uid)
-    old_slot = context.user_data.pop("reschedule_old_slot", None)
-    context.user_data.pop("reschedule_new_date", None)
-    context.user_data.pop("reschedule_new_time", None)
+    old_slot = context.user_data.pop("resched", (None,))[0]
 
     if old_slot and old_slot in appointments and appointments[old_slot].get("user_id") == uid:
         bk       = appointments[old_slot]
         svc_text = ", ".join(_svc_client_label(s, lang) for s in bk["services"])
         dur_unit = STRINGS[lang]["svc_dur_min"]
         text = (
-            tx(uid, "mybooking_header") +
-            f"📅 {bk.get('date_str', old_slot.split()[0])}\n"
-            f"🕐 {bk.get('time_range', old_slot.split()[1])}\n"
+            _tx(lang, "mybooking_header") +
+            f"📅 {bk.get('date_str', old_slot[:10])}\n"
+            f"🕐 {bk.get('time_range', old_slot[11:])}\n"
             f"✂️ {svc_text}\n"
             f"⏱ ~{bk.get('duration_mins', 30)} {dur_unit}\n\n"
-            f"{tx(uid, 'mybooking_confirmed')}"
+            f"{_tx(lang, 'mybooking_confirmed')}"
         )
-        await query.edit_message_text(
-            text, parse_mode="HTML",
+        await _safe_edit(
+            query, text, parse_mode="HTML",
             reply_markup=_mybooking_keyboard(uid, old_slot),
         )
     else:
-        await query.edit_message_text(tx(uid, "mybooking_none"))
+        await _safe_edit(query, _tx(lang, "mybooking_none"))
 
 
 async def cb_ur_back_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -3103,10 +3805,11 @@ async def cb_ur_back_date(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await query.answer()
     uid  = update.effective_user.id
     lang = _lang(uid)
-    context.user_data.pop("reschedule_new_date", None)
-    context.user_data.pop("reschedule_new_time", None)
-    await query.edit_message_text(
-        tx(uid, "reschedule_choose_date"),
+    state = context.user_data.get("resched")
+    if state:
+        context.user_data["resched"] = (state[0], None, None)
+    await _safe_edit(
+        query, tx(uid, "reschedule_choose_date"),
         parse_mode="HTML",
         reply_markup=_date_keyboard(lang, date_prefix="urdate", cancel_data="urback"),
     )
@@ -3114,53 +3817,50 @@ async def cb_ur_back_date(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 # ─────────────────────────── Barber: block/unblock slots ─────────────────────
 
+@_barber_only()
 async def cb_bblock_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show date picker to choose a slot to block."""
     query = update.callback_query
     await query.answer()
-    if not _is_barber(update.effective_user.id):
-        return
-    await query.edit_message_text(
-        "🚫 <b>Заблокировать слот</b>\n\nВыберите дату:",
+    await _safe_edit(
+        query, "🚫 <b>Заблокировать слот</b>\n\nВыберите дату:",
         parse_mode="HTML",
         reply_markup=_date_keyboard("ru", date_prefix="bblkdate", cancel_data="bmanage"),
     )
 
 
+@_barber_only()
 async def cb_bblock_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Date chosen — show time picker."""
     query = update.callback_query
     await query.answer()
-    if not _is_barber(update.effective_user.id):
-        return
     d = date.fromisoformat(query.data[len("bblkdate_"):])
-    context.user_data["bblock_date"] = d
+    context.user_data["bblock"] = (d, None)
     slots = _time_keyboard(d, "ru", time_prefix="bblktime", back_data="bblock", cancel_data="bmanage")
     if not slots:
-        await query.edit_message_text("Все слоты на эту дату уже заняты или заблокированы.")
+        await _safe_edit(query, "Все слоты на эту дату уже заняты или заблокированы.")
         return
-    await query.edit_message_text(
-        f"🚫 Выберите время для блокировки\n📅 {_fmt_date(d, 'ru')}:",
+    await _safe_edit(
+        query, f"🚫 Выберите время для блокировки\n📅 {_fmt_date(d, 'ru')}:",
         parse_mode="HTML",
         reply_markup=slots,
     )
 
 
+@_barber_only()
 async def cb_bblock_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Time chosen — ask confirmation."""
     query = update.callback_query
     await query.answer()
-    if not _is_barber(update.effective_user.id):
-        return
     t = query.data[len("bblktime_"):]
-    d = context.user_data.get("bblock_date")
+    d = context.user_data.get("bblock", (None,))[0]
     if not d:
-        await query.edit_message_text("Ошибка: дата не выбрана.")
+        await _safe_edit(query, "Ошибка: дата не выбрана.")
         return
-    context.user_data["bblock_time"] = t
-    slot_key = f"{d.isoformat()} {t}"
-    await query.edit_message_text(
-        f"🚫 Заблокировать <b>{_fmt_date(d, 'ru')} {t}</b>?\n\n"
+    # The slot key is built once here; confirm/unblock never re-parse it.
+    context.user_data["bblock"] = (d, f"{d.isoformat()} {t}")
+    await _safe_edit(
+        query, f"🚫 Заблокировать <b>{_fmt_date(d, 'ru')} {t}</b>?\n\n"
         f"Клиенты не смогут записаться на это время.",
         parse_mode="HTML",
         reply_markup=InlineKeyboardMarkup([
@@ -3170,43 +3870,38 @@ async def cb_bblock_time(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     )
 
 
+@_barber_only()
 async def cb_bblock_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Confirm block — save to memory and DB."""
     query = update.callback_query
     await query.answer()
-    if not _is_barber(update.effective_user.id):
+    d, slot_key = context.user_data.pop("bblock", (None, None))
+    if not d or not slot_key:
+        await _safe_edit(query, "Ошибка: данные не найдены.")
         return
-    d = context.user_data.pop("bblock_date", None)
-    t = context.user_data.pop("bblock_time", None)
-    if not d or not t:
-        await query.edit_message_text("Ошибка: данные не найдены.")
-        return
-    slot_key = f"{d.isoformat()} {t}"
-    blocked_slots.add(slot_key)
+    _block_slot(slot_key)
     _db_save_blocked(slot_key)
     logger.info("Barber blocked slot: %s", slot_key)
     text, kb = _build_manage_list()
-    await query.edit_message_text(
-        f"✅ Слот <b>{_fmt_date(d, 'ru')} {t}</b> заблокирован.\n\n" + text,
+    await _safe_edit(
+        query, f"✅ Слот <b>{_fmt_date(d, 'ru')} {slot_key[11:]}</b> заблокирован.\n\n" + text,
         parse_mode="HTML",
         reply_markup=kb,
     )
 
 
+@_barber_only()
 async def cb_bblock_unblock(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Unblock a previously blocked slot."""
     query = update.callback_query
     await query.answer()
-    if not _is_barber(update.effective_user.id):
-        return
-    encoded  = query.data[len("bblkunblock_"):]
-    slot_key = encoded.replace("_", " ", 1)
-    blocked_slots.discard(slot_key)
+    slot_key = _cb_slot(query.data[len("bblkunblock_"):])
+    _unblock_slot(slot_key)
     _db_delete_blocked(slot_key)
     logger.info("Barber unblocked slot: %s", slot_key)
     text, kb = _build_manage_list()
-    await query.edit_message_text(
-        f"🔓 Слот <b>{slot_key}</b> разблокирован.\n\n" + text,
+    await _safe_edit(
+        query, f"🔓 Слот <b>{slot_key}</b> разблокирован.\n\n" + text,
         parse_mode="HTML",
         reply_markup=kb,
     )
@@ -3220,12 +3915,32 @@ async def handle_unexpected(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 # ─────────────────────────── Application assembly ────────────────────────────
 
+# Command menus — default scope for customers, per-chat scope for barbers
+_CUSTOMER_COMMANDS: tuple[BotCommand, ...] = (
+    BotCommand("start",      "📅 Book / Записаться / Yozilish"),
+    BotCommand("mybooking",  "📋 My bookings / Мои записи / Yozilishlarim"),
+    BotCommand("settings",   "⚙️ Language / Язык / Til"),
+    BotCommand("help",       "ℹ️ Help / Помощь / Yordam"),
+)
+_BARBER_COMMANDS: tuple[BotCommand, ...] = (
+    BotCommand("start",    "✂️ Записать клиента"),
+    BotCommand("bookings", "📋 Записи на сегодня"),
+    BotCommand("week",     "🗓 Расписание на неделю"),
+    BotCommand("stats",    "📊 Статистика"),
+    BotCommand("broadcast","📢 Рассылка клиентам"),
+    BotCommand("config",   "⚙️ Рабочие часы"),
+    BotCommand("mybooking","📋 Моя запись"),
+    BotCommand("help",     "ℹ️ Помощь"),
+)
+
+
 async def _post_init(app: Application) -> None:
     """Register bot command menus and reschedule jobs for loaded data."""
-    from telegram import BotCommand, BotCommandScopeChat, BotCommandScopeDefault
-
-    # Reschedule customer + barber reminders for confirmed appointments loaded from DB
-    for slot_key, bk in appointments.items():
+    # Reschedule customer + barber reminders for confirmed appointments loaded
+    # from DB — only those still far enough ahead for a reminder, found by
+    # bisecting the sorted keys instead of walking the whole history.
+    for slot_key in _keys_from(_appt_keys, datetime.now(tz=TZ) + timedelta(minutes=30)):
+        bk = appointments[slot_key]
         _schedule_reminder(app, bk)
         _schedule_barber_reminder(app, bk)
 
@@ -3234,33 +3949,116 @@ async def _post_init(app: Application) -> None:
     #     _schedule_pending_timeout(app, bid, ...)
     logger.info("Pending timeout disabled — %d pending bookings loaded", len(pending_bookings))
 
-    customer_commands = [
-        BotCommand("start",      "📅 Book / Записаться / Yozilish"),
-        BotCommand("mybooking",  "📋 My bookings / Мои записи / Yozilishlarim"),
-        BotCommand("settings",   "⚙️ Language / Язык / Til"),
-        BotCommand("help",       "ℹ️ Help / Помощь / Yordam"),
-    ]
-    barber_commands = [
-        BotCommand("start",    "✂️ Записать клиента"),
-        BotCommand("bookings", "📋 Записи на сегодня"),
-        BotCommand("week",     "🗓 Расписание на неделю"),
-        BotCommand("stats",    "📊 Статистика"),
-        BotCommand("broadcast","📢 Рассылка клиентам"),
-        BotCommand("config",   "⚙️ Рабочие часы"),
-        BotCommand("mybooking","📋 Моя запись"),
-        BotCommand("help",     "ℹ️ Помощь"),
-    ]
+    # Menus persist on Telegram's side, so they are only re-sent when the
+    # commands, the barber list or the bot itself changed since last start.
+    menu_hash = hashlib.sha256(_dumps([
+        app.bot.id,
+        sorted(BARBER_CHAT_IDS),
+        [c.to_dict() for c in _CUSTOMER_COMMANDS],
+        [c.to_dict() for c in _BARBER_COMMANDS],
+    ]).encode()).hexdigest()
+    if _db_get_meta("commands_hash") == menu_hash:
+        logger.info("Bot command menus unchanged — skipping registration.")
+        return
 
-    # Default menu for all customers
-    await app.bot.set_my_commands(customer_commands, scope=BotCommandScopeDefault())
-    # Extended menu for all barbers
-    for bid in BARBER_CHAT_IDS:
-        await app.bot.set_my_commands(
-            barber_commands, scope=BotCommandScopeChat(chat_id=bid)
-        )
+    await asyncio.gather(
+        # Default menu for all customers
+        app.bot.set_my_commands(_CUSTOMER_COMMANDS, scope=BotCommandScopeDefault()),
+        # Extended menu for all barbers
+        *(app.bot.set_my_commands(_BARBER_COMMANDS, scope=BotCommandScopeChat(chat_id=bid))
+          for bid in BARBER_CHAT_IDS),
+    )
+    _db_set_meta("commands_hash", menu_hash)
     logger.info("Bot command menus registered.")
 
 
+# ─────────────────────────── Global callback routing ─────────────────────────
+# Callbacks outside the booking conversation are routed by one handler: an
+# exact-match table, then a table keyed by the text before the first "_"
+# whose payload (the rest) must fullmatch the given regex.  One or two dict
+# lookups replace trying ~30 regexes in turn.
+
+_CallbackFn = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[Any]]
+
+_SLOT_RE = re.compile(r"\d{4}-\d{2}-\d{2}_\d{2}:\d{2}")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_TIME_RE = re.compile(r"\d{2}:\d{2}")
+_SVC_ID_RE = re.compile(r"\w+")
+
+
+async def _cb_noop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.callback_query.answer()
+
+
+_CALLBACK_EXACT: dict[str, _CallbackFn] = {
+    "bmanage":     cb_bmanage,
+    "bclose":      cb_bclose,
+    "urconfirm":   cb_ur_confirm,
+    "urback":      cb_ur_back,
+    "urback_date": cb_ur_back_date,
+    "bblock":      cb_bblock_start,
+    "bblkconfirm": cb_bblock_confirm,
+    "cancel":      _cancel_cb,           # from an expired conversation keyboard
+}
+
+_CALLBACK_PREFIX: dict[str, tuple[_CallbackFn, re.Pattern[str] | None]] = {
+    "approve":     (cb_barber_decision,       re.compile(r"\d+")),
+    "reject":      (cb_barber_decision,       re.compile(r"\d+")),
+    "bselect":     (cb_bselect,               _SLOT_RE),
+    "bconfirm":    (cb_barber_confirm_cancel, _SLOT_RE),
+    "bcancel":     (cb_barber_cancel_booking, _SLOT_RE),
+    "setlang":     (cb_setlang,               re.compile(r"ru|uz")),
+    "bday":        (cb_bday_nav,              _DATE_RE),
+    "ucancel":     (cb_user_cancel,           _SLOT_RE),
+    "uresch":      (cb_user_reschedule,       _SLOT_RE),
+    "urdate":      (cb_ur_date,               _DATE_RE),
+    "urtime":      (cb_ur_time,               _TIME_RE),
+    "bblkdate":    (cb_bblock_date,           _DATE_RE),
+    "bblktime":    (cb_bblock_time,           _TIME_RE),
+    "bblkunblock": (cb_bblock_unblock,        None),
+    "cfg":         (cb_config,                None),
+    "stats":       (cb_stats_period,          re.compile(r"p_.*")),
+    "bcast":       (cb_broadcast,             re.compile(r"send|cancel")),
+}
+
+
+def _route_callback(data: object) -> _CallbackFn | None:
+    if not isinstance(data, str):
+        return None
+    handler = _CALLBACK_EXACT.get(data)
+    if handler is not None:
+        return handler
+    head, sep, payload = data.partition("_")
+    route = _CALLBACK_PREFIX.get(head) if sep else None
+    if route is None:
+        return None
+    handler, payload_re = route
+    if payload_re is not None and not payload_re.fullmatch(payload):
+        return None
+    return handler
+
+
+async def _dispatch_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Any:
+    return await _route_callback(update.callback_query.data)(update, context)
+
+
+def _state_pattern(*exact: str, prefix: str | None = None,
+                   payload: re.Pattern | None = None) -> Callable[[object], bool]:
+    """CallbackQueryHandler pattern for a conversation state: one of *exact*,
+    or *prefix* + a payload that fullmatches *payload* (anything if None)."""
+    exact_set = frozenset(exact)
+
+    def check(data: object) -> bool:
+        if not isinstance(data, str):
+            return False
+        if data in exact_set:
+            return True
+        if prefix is None or not data.startswith(prefix):
+            return False
+        return payload is None or payload.fullmatch(data, len(prefix)) is not None
+    return check
+
+
 def build_application() -> Application:
     app = Application.builder().token(BOT_TOKEN).post_init(_post_init).build()
 
@@ -3271,6 +4069,13 @@ def build_application() -> Application:
         "^(" + "|".join(re.escape(t) for t in MENU_LANG_TEXTS) + ")$"
     )
 
+    # Command handlers that behave the same inside and outside the booking
+    # conversation are built once and shared by the fallbacks and the
+    # global handler list.
+    cancel_h = CommandHandler("cancel", cmd_cancel)
+    help_h   = CommandHandler("help",   cmd_help)
+    info_h   = CommandHandler("info",   cmd_info)
+
     conv = ConversationHandler(
         entry_points=[
             CommandHandler("start", cmd_start),
@@ -3280,31 +4085,36 @@ def build_application() -> Application:
             # Patterns are intentionally narrow so that unrelated callbacks
             # (e.g. setlang_) fall through and are handled by global handlers.
             STATE_LANG:     [CallbackQueryHandler(cb_lang_selected,
-                                                   pattern=r"^lang_(ru|uz)$")],
+                                                   pattern=_state_pattern("lang_ru", "lang_uz"))],
             STATE_DATE:     [CallbackQueryHandler(cb_date_selected,
-                                                   pattern=r"^(date_\d{4}-\d{2}-\d{2}|cancel)$")],
+                                                   pattern=_state_pattern("cancel", prefix="date_",
+                                                                          payload=_DATE_RE))],
             STATE_TIME:     [CallbackQueryHandler(cb_time_selected,
-                                                   pattern=r"^(time_\d{2}:\d{2}|back_to_date|cancel)$")],
+                                                   pattern=_state_pattern("back_to_date", "cancel",
+                                                                          prefix="time_",
+                                                                          payload=_TIME_RE))],
             STATE_NAME:     [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_name)],
             STATE_PHONE:    [
                 MessageHandler(filters.CONTACT, handle_phone_contact),
                 MessageHandler(filters.TEXT & ~filters.COMMAND, handle_phone_text),
             ],
             STATE_SERVICES: [CallbackQueryHandler(cb_service_toggle,
-                                                   pattern=r"^(svc_\w+|services_done|cancel)$")],
+                                                   pattern=_state_pattern("services_done", "cancel",
+                                                                          prefix="svc_",
+                                                                          payload=_SVC_ID_RE))],
             STATE_CONFIRM:  [CallbackQueryHandler(cb_confirm,
-                                                   pattern=r"^(confirm_yes|cancel)$")],
+                                                   pattern=_state_pattern("confirm_yes", "cancel"))],
         },
         fallbacks=[
-            CommandHandler("cancel",   cmd_cancel),
+            cancel_h,
             # /settings mid-conversation: change language, then end the booking flow
             CommandHandler("settings", _settings_in_conv),
-            CommandHandler("help",     cmd_help),
-            CommandHandler("info",     cmd_info),
+            help_h,
+            info_h,
             # "Choose language" persistent menu button mid-conversation
             MessageHandler(_lang_filter, _settings_in_conv),
             # barber config callbacks must work even if barber is in conversation state
-            CallbackQueryHandler(cb_config, pattern=r"^cfg_"),
+            CallbackQueryHandler(cb_config, pattern=_state_pattern(prefix="cfg_")),
             MessageHandler(filters.ALL, handle_unexpected),
         ],
         allow_reentry=True,
@@ -3313,21 +4123,12 @@ def build_application() -> Application:
 
     app.add_handler(conv)
 
-    # Global handlers — process callbacks that the ConversationHandler lets through
-    app.add_handler(CallbackQueryHandler(cb_barber_decision,
-                                          pattern=r"^(approve|reject)_\d+$"))
-    app.add_handler(CallbackQueryHandler(cb_bmanage,  pattern=r"^bmanage$"))
-    app.add_handler(CallbackQueryHandler(cb_bselect,
-                                          pattern=r"^bselect_\d{4}-\d{2}-\d{2}_\d{2}:\d{2}$"))
-    app.add_handler(CallbackQueryHandler(cb_bclose,   pattern=r"^bclose$"))
-    app.add_handler(CallbackQueryHandler(cb_barber_confirm_cancel,
-                                          pattern=r"^bconfirm_\d{4}-\d{2}-\d{2}_\d{2}:\d{2}$"))
-    app.add_handler(CallbackQueryHandler(cb_barber_cancel_booking,
-                                          pattern=r"^bcancel_\d{4}-\d{2}-\d{2}_\d{2}:\d{2}$"))
-    app.add_handler(CallbackQueryHandler(cb_setlang,
-                                          pattern=r"^setlang_(ru|uz)$"))
-
-    app.add_handler(CallbackQueryHandler(cb_bday_nav, pattern=r"^bday_\d{4}-\d{2}-\d{2}$"))
+    # Taps on non-clickable header buttons only need an ack; block=False keeps
+    # them from queueing ahead of real work.
+    app.add_handler(CallbackQueryHandler(_cb_noop, pattern=_state_pattern("noop"), block=False))
+    # Global callbacks — everything the ConversationHandler lets through
+    app.add_handler(CallbackQueryHandler(_dispatch_callback, pattern=_route_callback))
+
     app.add_handler(CommandHandler("bookings",  cmd_bookings))
     app.add_handler(CommandHandler("week",      cmd_week))
     app.add_handler(CommandHandler("settings",  cmd_settings))
@@ -3335,39 +4136,12 @@ def build_application() -> Application:
     app.add_handler(CommandHandler("stats",     cmd_stats))
     app.add_handler(CommandHandler("broadcast", cmd_broadcast))
     app.add_handler(CommandHandler("mybooking", cmd_mybooking))
-    app.add_handler(CommandHandler("help",      cmd_help))
-    app.add_handler(CommandHandler("info",      cmd_info))
+    app.add_handler(help_h)
+    app.add_handler(info_h)
     # /cancel also works outside an active booking conversation
-    app.add_handler(CommandHandler("cancel",    cmd_cancel))
+    app.add_handler(cancel_h)
     # Persistent menu "language" button (outside conversation)
     app.add_handler(MessageHandler(_lang_filter, cmd_menu_lang))
-    app.add_handler(CallbackQueryHandler(cb_user_cancel,
-                                          pattern=r"^ucancel_\d{4}-\d{2}-\d{2}_\d{2}:\d{2}$"))
-    # Reschedule flow
-    app.add_handler(CallbackQueryHandler(cb_user_reschedule,
-                                          pattern=r"^uresch_\d{4}-\d{2}-\d{2}_\d{2}:\d{2}$"))
-    app.add_handler(CallbackQueryHandler(cb_ur_date,
-                                          pattern=r"^urdate_\d{4}-\d{2}-\d{2}$"))
-    app.add_handler(CallbackQueryHandler(cb_ur_time,
-                                          pattern=r"^urtime_\d{2}:\d{2}$"))
-    app.add_handler(CallbackQueryHandler(cb_ur_confirm,    pattern=r"^urconfirm$"))
-    app.add_handler(CallbackQueryHandler(cb_ur_back,       pattern=r"^urback$"))
-    app.add_handler(CallbackQueryHandler(cb_ur_back_date,  pattern=r"^urback_date$"))
-    # Block/unblock time slots (barber)
-    app.add_handler(CallbackQueryHandler(cb_bblock_start,   pattern=r"^bblock$"))
-    app.add_handler(CallbackQueryHandler(cb_bblock_date,    pattern=r"^bblkdate_\d{4}-\d{2}-\d{2}$"))
-    app.add_handler(CallbackQueryHandler(cb_bblock_time,    pattern=r"^bblktime_\d{2}:\d{2}$"))
-    app.add_handler(CallbackQueryHandler(cb_bblock_confirm, pattern=r"^bblkconfirm$"))
-    app.add_handler(CallbackQueryHandler(cb_bblock_unblock, pattern=r"^bblkunblock_"))
-    # "cancel" inline button from an expired conversation keyboard
-    app.add_handler(CallbackQueryHandler(_cancel_cb, pattern=r"^cancel$"))
-    app.add_handler(CallbackQueryHandler(cb_config, pattern=r"^cfg_"))
-    app.add_handler(CallbackQueryHandler(lambda u, c: u.callback_query.answer(),
-                                          pattern=r"^noop$"))
-    # /stats period picker (must come after ConversationHandler)
-    app.add_handler(CallbackQueryHandler(cb_stats_period, pattern=r"^stats_p_"))
-    # /broadcast confirm / cancel
-    app.add_handler(CallbackQueryHandler(cb_broadcast, pattern=r"^bcast_(send|cancel)$"))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND,
                                     on_stats_custom_text), group=1)
 
@@ -3376,11 +4150,28 @@ def build_application() -> Application:
 
 # ─────────────────────────── Entry point ─────────────────────────────────────
 
+# Only the update types some handler consumes — Telegram drops the rest
+# (edited messages, inline queries, chat-member events…) before sending.
+_ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+
 def main() -> None:
     logger.info("Starting Barber Shop Bot…")
     _init_db()
     _load_all()
-    build_application().run_polling(allowed_updates=Update.ALL_TYPES)
+    app = build_application()
+    if WEBHOOK_URL and "--polling" not in sys.argv[1:]:
+        logger.info("Webhook mode on port %d", WEBHOOK_PORT)
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=WEBHOOK_PORT,
+            url_path=BOT_TOKEN,
+            webhook_url=f"{WEBHOOK_URL}/{BOT_TOKEN}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=_ALLOWED_UPDATES,
+        )
+    else:
+        app.run_polling(allowed_updates=_ALLOWED_UPDATES)
 
 
 if __name__ == "__main__":